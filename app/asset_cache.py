@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout (JSON lines): a header line with the snapshot metadata,
+# followed by one asset per line.
+
+
+def load_asset_snapshot(path=None):
+    """
+    Load the last good asset snapshot
+    Returns:
+        dict: {'time_retrieved', 'etag', 'assets'} or None when no readable snapshot exists
+    """
+    path = path or settings.ASSET_CACHE_PATH
+    try:
+        with open(path, encoding="utf-8") as snapshot_file:
+            header = json.loads(next(snapshot_file))
+            assets = [json.loads(line) for line in snapshot_file if line.strip()]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, StopIteration) as e:
+        logger.warning(f"Ignoring unreadable asset snapshot {path}: {e}")
+        return None
+
+    if len(assets) != header.get("count"):
+        logger.warning(f"Ignoring truncated asset snapshot {path}")
+        return None
+    return {
+        "time_retrieved": header.get("time_retrieved"),
+        "etag": header.get("etag"),
+        "assets": assets
+    }
+
+
+def save_asset_snapshot(assets, time_retrieved=None, etag=None, path=None):
+    """Write the snapshot atomically so readers never see a partial file"""
+    path = path or settings.ASSET_CACHE_PATH
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    header = {
+        "time_retrieved": time_retrieved or int(time.time() * 1000),
+        "etag": etag,
+        "count": len(assets)
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".assets-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as snapshot_file:
+            snapshot_file.write(json.dumps(header) + "\n")
+            for asset in assets:
+                snapshot_file.write(json.dumps(asset, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.debug(f"Saved {len(assets)} assets to {path}")
+
+
+def snapshot_age_seconds(snapshot):
+    return time.time() - (snapshot.get("time_retrieved") or 0) / 1000
+
+
+def is_snapshot_fresh(snapshot, ttl=None):
+    """True while the snapshot is younger than ttl seconds (default: settings.ASSET_CACHE_TTL)"""
+    ttl = settings.ASSET_CACHE_TTL if ttl is None else ttl
+    return snapshot is not None and snapshot_age_seconds(snapshot) < ttl
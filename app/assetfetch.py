@@ -206,47 +206,150 @@
 
 import requests
 import json
+import logging
+import math
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuration
 REAL_API_URL = os.getenv("REAL_API_URL")
 REAL_API_TOKEN = os.getenv("REAL_API_TOKEN")
-
-def fetch_assets_raw():
-    payload = {
-        "domain": "lremcofc",
-        "offset": 1,
-        "pageSize": 100,
-        "operationStatus": ["ACTIVE", "Running"],
-        "communicationStatus": ["COMMUNICATING"]
-    }
-
-    headers = {
-        'Authorization': f'Bearer {REAL_API_TOKEN}',
-        'Content-Type': 'application/json'
+ASSET_PAGE_SIZE = int(os.getenv("ASSET_PAGE_SIZE", "100"))
+ASSET_FETCH_CONCURRENCY = int(os.getenv("ASSET_FETCH_CONCURRENCY", "8"))
+
+BASE_PAYLOAD = {
+    "domain": "lremcofc",
+    "operationStatus": ["ACTIVE", "Running"],
+    "communicationStatus": ["COMMUNICATING"]
+}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Shared keep-alive session whose connection pool fits ASSET_FETCH_CONCURRENCY requests"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, ASSET_FETCH_CONCURRENCY))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                'Authorization': f'Bearer {REAL_API_TOKEN}',
+                'Content-Type': 'application/json'
+            })
+            _http_session = session
+        return _http_session
+
+def fetch_asset_page(offset, page_size, session=None, headers=None):
+    """
+    Fetch one page of assets; offset is the 1-based page number expected by the API
+    Returns:
+        tuple: (assets, total or None, page timing dict); assets is None when the
+        server answered 304 Not Modified to conditional headers
+    """
+    session = session or get_http_session()
+    start_time = time.time()
+    response = session.post(
+        REAL_API_URL,
+        json={**BASE_PAYLOAD, "offset": offset, "pageSize": page_size},
+        headers=headers,
+        timeout=10
+    )
+    if response.status_code == 304:
+        timing = {"offset": offset, "count": 0, "elapsed": round(time.time() - start_time, 3)}
+        return None, None, timing
+    response.raise_for_status()
+
+    data = response.json().get('data', {})
+    assets = data.get('assets', [])
+    if not isinstance(assets, list):
+        raise ValueError("Invalid assets format in response")
+    timing = {
+        "offset": offset,
+        "count": len(assets),
+        "elapsed": round(time.time() - start_time, 3),
+        "etag": response.headers.get("ETag")
     }
+    return assets, data.get('total'), timing
+
+def fetch_assets_raw(page_size=None, concurrency=None, etag=None, time_retrieved=None):
+    """
+    Fetch every asset page and merge them into one list
+
+    The first page provides the total; the remaining pages are then fetched
+    concurrently over the shared session with at most `concurrency` requests in
+    flight. When the API does not report a total, pages are read one after
+    another until a short page is returned.
+
+    etag / time_retrieved (epoch ms) of a cached snapshot make the first request
+    conditional; if the server answers 304 the result has 'not_modified': True
+    and no assets.
+    """
+    page_size = page_size or ASSET_PAGE_SIZE
+    concurrency = max(1, concurrency or ASSET_FETCH_CONCURRENCY)
+
+    conditional_headers = {}
+    if etag:
+        conditional_headers['If-None-Match'] = etag
+    if time_retrieved:
+        conditional_headers['If-Modified-Since'] = formatdate(time_retrieved / 1000, usegmt=True)
 
     try:
-        response = requests.post(
-            REAL_API_URL,
-            json=payload,
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-
-        response_data = response.json()
-        assets = response_data.get('data', {}).get('assets', [])
+        assets, total, first_timing = fetch_asset_page(1, page_size, headers=conditional_headers or None)
+        if assets is None:
+            return {
+                "success": True,
+                "not_modified": True,
+                "data": {"time_retrieved": int(time.time() * 1000)}
+            }
+        pages = [first_timing]
+
+        if total is not None:
+            page_count = math.ceil(total / page_size) if total else 1
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='asset-page') as executor:
+                for page_assets, _, timing in executor.map(
+                    lambda offset: fetch_asset_page(offset, page_size),
+                    range(2, page_count + 1)
+                ):
+                    assets.extend(page_assets)
+                    pages.append(timing)
+        else:
+            offset = 1
+            while pages[-1]["count"] == page_size:
+                offset += 1
+                page_assets, _, timing = fetch_asset_page(offset, page_size)
+                assets.extend(page_assets)
+                pages.append(timing)
+
+        # Pages can overlap if the fleet changes mid-fetch; keep the first copy of each asset
+        seen = set()
+        unique_assets = []
+        for asset in assets:
+            if asset.get('identifier') not in seen:
+                seen.add(asset.get('identifier'))
+                unique_assets.append(asset)
+        for timing in pages:
+            logger.debug(f"Asset page {timing['offset']}: {timing['count']} assets in {timing['elapsed']:.3f}s")
 
         return {
             "success": True,
             "data": {
-                "assets": assets,
-                "count": len(assets),
+                "assets": unique_assets,
+                "count": len(unique_assets),
+                "total": total,
+                "pages": pages,
+                "etag": first_timing.get("etag"),
                 "time_retrieved": int(time.time() * 1000)
             }
         }
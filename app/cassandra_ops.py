@@ -1,56 +1,371 @@
 
 
-from cassandra.policies import DCAwareRoundRobinPolicy
+from cassandra.policies import DCAwareRoundRobinPolicy, HostDistance, TokenAwarePolicy
 from cassandra.auth import PlainTextAuthProvider
 from datetime import datetime, time, timedelta, timezone, date
-from cassandra.cluster import Cluster
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
 from config.settings import settings
+from collections import deque
+from itertools import islice
 import logging
+import threading
+import time as time_module
+import weakref
 from cassandra.query import SimpleStatement
+from app.metrics import CASSANDRA_QUERY_SECONDS, instrument
+from app.event_buffer import event_buffer_row_factory
 logger = logging.getLogger(__name__)
 
+# datatime is the clustering column, so rows arrive already ordered and are paged by the driver
+LOGS_FOR_DAY_CQL = """
+    SELECT datatime, data
+    FROM big_data_store.run_status
+    WHERE thingid = ? AND datadate = ?
+    ORDER BY datatime ASC
+"""
+
+# Same read restricted to a datatime window, used where a UAE day range cuts a UTC partition
+LOGS_IN_WINDOW_CQL = """
+    SELECT datatime, data
+    FROM big_data_store.run_status
+    WHERE thingid = ? AND datadate = ? AND datatime >= ? AND datatime < ?
+    ORDER BY datatime ASC
+"""
+
+# Live polling: only logs newer than the last datatime already seen
+LOGS_AFTER_CQL = """
+    SELECT datatime, data
+    FROM big_data_store.run_status
+    WHERE thingid = ? AND datadate = ? AND datatime > ? AND datatime < ?
+    ORDER BY datatime ASC
+"""
+
+# Columnar reads select the clustering column as bigint epoch milliseconds, so the driver
+# decodes an int per row instead of building a datetime, and the EVENT_BUFFER_PROFILE
+# row factory packs each page into an EventBuffer
+EVENT_BUFFER_PROFILE = "event_buffer"
+_EVENT_SELECT = "SELECT toUnixTimestamp(datatime), data"
+
+def _event_cql(cql):
+    return cql.replace("SELECT datatime, data", _EVENT_SELECT, 1)
+
+PARTITION_PROBE_CQL = """
+    SELECT datatime FROM big_data_store.run_status
+    WHERE thingid = ? AND datadate = ?
+    LIMIT 1
+"""
+
+# Prepared statements per session, so each CQL string is parsed by the cluster only once
+_prepared_statements = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
 uae_tz = timezone(timedelta(hours=4))
 def utc_to_uae(dt_utc):
     return dt_utc.replace(tzinfo=timezone.utc).astimezone(uae_tz)
 
+def build_cassandra_cluster():
+    """
+    Create a Cluster with the configured load balancing, protocol and pool sizing
+
+    Bound statements carry their partition key, so TokenAwarePolicy sends each read
+    straight to a replica of (thingid, datadate) in the local DC.
+    """
+    local_dc = settings.CASSANDRA_LOCAL_DC or "datacenter1"
+    cluster = Cluster(
+        [settings.CASSANDRA_HOST],
+        execution_profiles={
+            EXEC_PROFILE_DEFAULT: ExecutionProfile(
+                load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc))
+            ),
+            EVENT_BUFFER_PROFILE: ExecutionProfile(
+                load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc)),
+                row_factory=event_buffer_row_factory
+            )
+        },
+        protocol_version=settings.CASSANDRA_PROTOCOL_VERSION,
+        executor_threads=settings.CASSANDRA_EXECUTOR_THREADS
+    )
+    if settings.CASSANDRA_PROTOCOL_VERSION < 3:
+        # Protocol v3+ multiplexes requests over one connection per host
+        cluster.set_core_connections_per_host(HostDistance.LOCAL, settings.CASSANDRA_CONNECTIONS_PER_HOST)
+        cluster.set_max_connections_per_host(HostDistance.LOCAL, settings.CASSANDRA_CONNECTIONS_PER_HOST)
+    return cluster
+
 def connect_to_cassandra():
     try:
-        cluster = Cluster(
-            [settings.CASSANDRA_HOST],
-            load_balancing_policy=DCAwareRoundRobinPolicy(settings.CASSANDRA_LOCAL_DC or "datacenter1"),
-            protocol_version=settings.CASSANDRA_PROTOCOL_VERSION
-        )
+        cluster = build_cassandra_cluster()
         session = cluster.connect(settings.CASSANDRA_KEYSPACE)
         logger.info(f"✅ Connected to Cassandra at {settings.CASSANDRA_HOST}")
         return session
     except Exception as e:
         logger.error(f"❌ Error connecting to Cassandra: {e}")
         raise
-def fetch_logs_for_day(session, thingid, datadate_utc_date):
-    datadate_utc = datetime.combine(datadate_utc_date, time.min).replace(tzinfo=timezone.utc)
-    query = """
-        SELECT datatime, data 
-        FROM big_data_store.run_status
-        WHERE thingid = %s AND datadate = %s
-        LIMIT 1000
+def prepare_statement(session, cql):
+    """Return a prepared statement for cql, preparing it once per session"""
+    with _prepared_lock:
+        statements = _prepared_statements.setdefault(session, {})
+        if cql not in statements:
+            statements[cql] = session.prepare(cql)
+        return statements[cql]
+
+def _partition_key(datadate_utc_date):
+    return datetime.combine(datadate_utc_date, time.min).replace(tzinfo=timezone.utc)
+
+def partitions_for_uae_range(start_date, end_date):
+    """
+    UTC partition dates holding the logs of the UAE days start_date..end_date.
+
+    A UAE day starts at 20:00 UTC of the previous day, so the range spans the
+    partitions from start_date - 1 to end_date.
+    """
+    first = start_date - timedelta(days=1)
+    return [first + timedelta(days=offset) for offset in range((end_date - first).days + 1)]
+
+def _bind_logs_for_day(session, thingid, datadate_utc_date, fetch_size=None, window=None, after=False,
+                       columnar=False):
+    if window:
+        cql = LOGS_AFTER_CQL if after else LOGS_IN_WINDOW_CQL
+        params = (thingid, _partition_key(datadate_utc_date), window[0], window[1])
+    else:
+        cql = LOGS_FOR_DAY_CQL
+        params = (thingid, _partition_key(datadate_utc_date))
+    bound = prepare_statement(session, _event_cql(cql) if columnar else cql).bind(params)
+    bound.fetch_size = fetch_size or settings.CASSANDRA_FETCH_SIZE
+    return bound
+
+def _iter_logs(rows, thingid, datadate_utc_date):
+    """
+    Yield (datatime_utc, state) from a paged result set; further pages are fetched on demand.
+    A failed page read is raised, so a partially read day is never calculated as complete
     """
     try:
-        rows = session.execute(query, (thingid, datadate_utc))
-        results = []
         for row in rows:
             dt = row.datatime
             if dt.tzinfo is None:
                 dt = dt.replace(tzinfo=timezone.utc)
-            results.append((dt, row.data.strip()))
-        results.sort(key=lambda x: x[0])
-        logger.info(f"Fetched {len(results)} logs for {thingid} on {datadate_utc_date}")
-        return results
+            yield dt, row.data.strip()
     except Exception as e:
         logger.error(f"Error fetching logs for {thingid} on {datadate_utc_date}: {e}")
-        return []
+        raise
+
+def iter_event_buffers(pages, thingid, datadate_utc_date):
+    """Yield one EventBuffer per result page; further pages are fetched on demand and a failed one is raised"""
+    try:
+        yield from pages
+    except Exception as e:
+        logger.error(f"Error fetching logs for {thingid} on {datadate_utc_date}: {e}")
+        raise
+
+def iter_logs_for_day(session, thingid, datadate_utc_date, fetch_size=None):
+    """
+    Stream the logs of one day partition in clustering (datatime) order
+
+    Args:
+        session: Cassandra session
+        thingid: Asset identifier
+        datadate_utc_date: UTC partition date
+        fetch_size: Rows per page (default: settings.CASSANDRA_FETCH_SIZE)
+
+    Yields:
+        tuple: (datatime_utc, state)
+
+    Raises any read error, including one on a later page
+    """
+    try:
+        rows = session.execute(_bind_logs_for_day(session, thingid, datadate_utc_date, fetch_size))
+    except Exception as e:
+        logger.error(f"Error fetching logs for {thingid} on {datadate_utc_date}: {e}")
+        raise
+    yield from _iter_logs(rows, thingid, datadate_utc_date)
+
+@instrument(CASSANDRA_QUERY_SECONDS, query="fetch_logs_for_day")
+def fetch_logs_for_day(session, thingid, datadate_utc_date, fetch_size=None):
+    results = list(iter_logs_for_day(session, thingid, datadate_utc_date, fetch_size))
+    logger.info(f"Fetched {len(results)} logs for {thingid} on {datadate_utc_date}")
+    return results
+
+def _observe_latency(future, query):
+    """Record the time until the first page of an async read arrives, whenever it is consumed"""
+    started = time_module.perf_counter()
+    observed = []
+
+    def observe(_):
+        # Callbacks run again for every further page fetched with start_fetching_next_page()
+        if not observed:
+            observed.append(True)
+            CASSANDRA_QUERY_SECONDS.observe(time_module.perf_counter() - started, query=query)
+
+    future.add_callbacks(observe, observe)
+
+def read_partition_async(session, thingid, datadate_utc_date, fetch_size=None, window=None, after=False,
+                         columnar=False):
+    """
+    Start the read of one day partition and return its ResponseFuture
+
+    With columnar set the read goes through EVENT_BUFFER_PROFILE and its pages are
+    EventBuffers (see iter_event_buffers); otherwise rows are driver rows (see _iter_logs).
+    """
+    bound = _bind_logs_for_day(session, thingid, datadate_utc_date, fetch_size, window, after, columnar)
+    if columnar:
+        future = session.execute_async(bound, execution_profile=EVENT_BUFFER_PROFILE)
+    else:
+        future = session.execute_async(bound)
+    _observe_latency(future, "logs_partition")
+    return future
+
+def fetch_logs_for_range(session, thingid, days, concurrency=None, fetch_size=None, window=None, after=False,
+                         columnar=False):
+    """
+    Stream the logs of several day partitions with a bounded number of reads in flight
+
+    The first page of up to `concurrency` partitions is requested ahead; remaining
+    pages of a partition are fetched while its iterator is consumed, so each
+    partition's logs must be consumed before advancing to the next one.
+
+    Args:
+        session: Cassandra session
+        thingid: Asset identifier
+        days: Iterable of UTC partition dates, in the order results should be returned
+        concurrency: Maximum reads in flight (default: settings.CASSANDRA_CONCURRENCY)
+        fetch_size: Rows per page (default: settings.CASSANDRA_FETCH_SIZE)
+        window: Optional (since, until) datetimes; only logs with since <= datatime < until are read
+        after: Exclude since itself from the window (since < datatime < until)
+        columnar: Read through EVENT_BUFFER_PROFILE and yield EventBuffer pages instead of tuples
+
+    Yields:
+        tuple: (day, logs) in the order of days, where logs is an iterator of
+        (datatime_utc, state) in datatime order, or of EventBuffer pages when
+        columnar is set
+
+    Raises the error of a failed read, or of a failed later page while its logs are consumed,
+    so the caller never calculates a partially read range
+    """
+    concurrency = max(1, concurrency or settings.CASSANDRA_CONCURRENCY)
+    days = iter(days)
+    pending = deque()
+
+    def submit(day):
+        pending.append((day, read_partition_async(session, thingid, day, fetch_size, window, after, columnar)))
+
+    for day in islice(days, concurrency):
+        submit(day)
+
+    while pending:
+        day, future = pending.popleft()
+        # Keep the window full before blocking on the oldest read
+        next_day = next(days, None)
+        if next_day is not None:
+            submit(next_day)
+        try:
+            rows = future.result()
+        except Exception as e:
+            logger.error(f"Error fetching logs for {thingid} on {day}: {e}")
+            raise
+        if columnar:
+            yield day, iter_event_buffers(rows, thingid, day)
+        else:
+            yield day, _iter_logs(rows, thingid, day)
     
 
-def get_earliest_log_date(session, thingid, created_date=None, max_days_back=365, scan_end=None):
+def _probe_days(session, thingid, days):
+    """
+    Send one LIMIT 1 probe per day partition concurrently and return {day: has_logs}.
+    A failed probe is raised: counting its day as empty could skip the earliest logs
+    """
+    statement = prepare_statement(session, PARTITION_PROBE_CQL)
+    futures = []
+    for day in days:
+        future = session.execute_async(statement, (thingid, _partition_key(day)))
+        _observe_latency(future, "partition_probe")
+        futures.append((day, future))
+    found = {}
+    for day, future in futures:
+        try:
+            found[day] = future.result().one() is not None
+        except Exception as e:
+            logger.error(f"Query error on {day} for {thingid}: {e}")
+            raise
+    return found
+
+def _sweep_earliest_log_date(session, thingid, days, wave_size):
+    """Probe days (ascending) in concurrent waves and return the first day with logs"""
+    for wave_start in range(0, len(days), wave_size):
+        wave = days[wave_start:wave_start + wave_size]
+        found = _probe_days(session, thingid, wave)
+        for day in wave:
+            if found[day]:
+                return day
+    return None
+
+def _bisect_earliest_log_date(session, thingid, scan_start, scan_end, probe_width):
+    """
+    Find the first day with logs in a logarithmic number of concurrent probe waves.
+
+    The first wave probes days exponentially spaced back from scan_end. The gap
+    between the earliest hit and the miss before it is then narrowed with waves of
+    up to probe_width evenly spaced probes. This assumes an asset logs every day
+    once it has started: with a gap in the history it can return a day after the
+    earliest one, so it is only used when EARLIEST_LOG_SEARCH is "bisect". If no
+    exponential probe hits, the whole range is swept in waves so sparse assets are
+    still found.
+    """
+    span = (scan_end - scan_start).days
+    offsets = {min(2 ** i - 1, span) for i in range(span.bit_length() + 1)} | {span}
+    probes = sorted(scan_end - timedelta(days=offset) for offset in offsets)
+    found = _probe_days(session, thingid, probes)
+
+    hits = [day for day in probes if found[day]]
+    if not hits:
+        unprobed = [scan_start + timedelta(days=offset) for offset in range(span + 1)]
+        unprobed = [day for day in unprobed if day not in found]
+        return _sweep_earliest_log_date(session, thingid, unprobed, settings.CASSANDRA_CONCURRENCY)
+
+    hi = hits[0]
+    if hi == scan_start:
+        return hi
+    lo = probes[probes.index(hi) - 1]
+
+    # Invariant: lo has no logs, hi has logs, days strictly between are unknown
+    while (hi - lo).days > 1:
+        gap = (hi - lo).days - 1
+        width = min(probe_width, gap)
+        candidates = sorted({
+            lo + timedelta(days=round((i + 1) * (gap + 1) / (width + 1)))
+            for i in range(width)
+        })
+        found = _probe_days(session, thingid, candidates)
+        wave_hits = [day for day in candidates if found[day]]
+        if wave_hits:
+            hi = wave_hits[0]
+            misses = [day for day in candidates if day < hi]
+            lo = misses[-1] if misses else lo
+        else:
+            lo = candidates[-1]
+    return hi
+
+def _scan_earliest_log_date(session, thingid, scan_start, scan_end):
+    """Walk forward one day at a time and return the first day with logs"""
+    statement = prepare_statement(session, PARTITION_PROBE_CQL)
+    current_date = scan_start
+
+    while current_date <= scan_end:
+        try:
+            result = session.execute(statement, (thingid, _partition_key(current_date)))
+
+            if result.one():
+                logger.debug(f"Found log for {thingid} on {current_date}")
+                return current_date
+
+        except Exception as e:
+            logger.error(f"Query error on {current_date} for {thingid}: {e}")
+            raise
+
+        current_date += timedelta(days=1)
+    return None
+
+@instrument(CASSANDRA_QUERY_SECONDS, query="earliest_log_date")
+def get_earliest_log_date(session, thingid, created_date=None, max_days_back=365, scan_end=None,
+                          search=None, probe_width=None):
     """
     Find the earliest log date for an asset, using created_date if available to optimize search
     
@@ -60,50 +375,37 @@ def get_earliest_log_date(session, thingid, created_date=None, max_days_back=365
         created_date: Optional date when asset was created (to optimize search)
         max_days_back: Maximum days to look back (default: 365)
         scan_end: End date for scanning (default: yesterday)
+        search: 'linear' for a day-by-day scan, or 'bisect' for concurrent exponential probing
+                and narrowing, which can miss days before a gap in the history
+                (default: settings.EARLIEST_LOG_SEARCH)
+        probe_width: Probes per narrowing wave in bisect mode (default: settings.EARLIEST_LOG_PROBES)
         
     Returns:
         date: Earliest log date found or None
+    Raises any probe error, so the asset fails instead of starting after unread days
     """
     if scan_end is None:
         scan_end = date.today() - timedelta(days=1)
+    search = search or settings.EARLIEST_LOG_SEARCH
+    probe_width = max(1, probe_width or settings.EARLIEST_LOG_PROBES)
 
     # Adjust search range based on created_date if available
     if created_date:
         # Don't search before the asset was created
-        effective_max_days_back = min(max_days_back, (scan_end - created_date).days)
         scan_start = max(created_date, scan_end - timedelta(days=max_days_back))
         logger.debug(f"Using created_date {created_date} to optimize search for {thingid}")
     else:
-        effective_max_days_back = max_days_back
         scan_start = scan_end - timedelta(days=max_days_back)
 
-    current_date = scan_start
-    found_date = None
-
-    while current_date <= scan_end:
-        try:
-            # Convert date to timestamp at midnight UTC
-            datadate_ts = datetime.combine(current_date, time.min).replace(tzinfo=timezone.utc)
-            
-            query = """
-                SELECT datatime FROM big_data_store.run_status
-                WHERE thingid = %s AND datadate = %s
-                LIMIT 1
-            """
-            result = session.execute(query, (thingid, datadate_ts))
-            
-            if result.one():
-                logger.debug(f"Found log for {thingid} on {current_date}")
-                found_date = current_date
-                # No need to check further dates - return the first found
-                logger.info(f"Earliest log found for {thingid} on {found_date}")
-                return found_date
-                
-        except Exception as e:
-            logger.error(f"Query error on {current_date} for {thingid}: {e}")
-
-        current_date += timedelta(days=1)
+    if scan_start > scan_end:
+        found_date = None
+    elif search == "bisect":
+        found_date = _bisect_earliest_log_date(session, thingid, scan_start, scan_end, probe_width)
+    else:
+        found_date = _scan_earliest_log_date(session, thingid, scan_start, scan_end)
 
     if found_date is None:
         logger.warning(f"No logs found for {thingid} between {scan_start} and {scan_end}")
-    return found_date
\ No newline at end of file
+    else:
+        logger.info(f"Earliest log found for {thingid} on {found_date}")
+    return found_date
@@ -0,0 +1,93 @@
+import logging
+import threading
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from config.settings import settings
+from app.cassandra_ops import build_cassandra_cluster
+from app.postgres_ops import apply_session_settings
+
+logger = logging.getLogger(__name__)
+
+
+class _SessionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool that applies the session settings once per physical connection"""
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        apply_session_settings(conn)
+        return conn
+
+
+class ConnectionManager:
+    """
+    Shared connection lifecycle for a run.
+
+    Holds a sized PostgreSQL pool and one long-lived Cassandra Cluster/Session.
+    Workers borrow a PostgreSQL connection with `with manager.postgres() as conn:`;
+    borrowers block while the pool is exhausted instead of failing.
+    """
+
+    def __init__(self, pg_minconn=None, pg_maxconn=None):
+        self.pg_minconn = pg_minconn or settings.POSTGRES_POOL_MIN
+        self.pg_maxconn = max(self.pg_minconn, pg_maxconn or settings.POSTGRES_POOL_MAX)
+        self._pg_pool = None
+        self._pg_slots = threading.BoundedSemaphore(self.pg_maxconn)
+        self._cluster = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_pg_pool(self):
+        with self._lock:
+            if self._pg_pool is None:
+                self._pg_pool = _SessionPool(
+                    self.pg_minconn,
+                    self.pg_maxconn,
+                    host=settings.POSTGRES_HOST,
+                    database=settings.POSTGRES_DB,
+                    user=settings.POSTGRES_USER,
+                    password=settings.POSTGRES_PASSWORD
+                )
+                logger.info(f"PostgreSQL pool ready ({self.pg_minconn}-{self.pg_maxconn} connections)")
+            return self._pg_pool
+
+    @contextmanager
+    def postgres(self):
+        """Borrow a PostgreSQL connection; it is rolled back on error and returned to the pool"""
+        pool = self._get_pg_pool()
+        with self._pg_slots:
+            conn = pool.getconn()
+            try:
+                yield conn
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
+
+    @property
+    def cassandra_session(self):
+        """The shared Cassandra session, connected on first use"""
+        with self._lock:
+            if self._session is None:
+                self._cluster = build_cassandra_cluster()
+                self._session = self._cluster.connect(settings.CASSANDRA_KEYSPACE)
+                logger.info(f"✅ Connected to Cassandra at {settings.CASSANDRA_HOST}")
+            return self._session
+
+    def close(self):
+        """Close every pooled PostgreSQL connection and shut the Cassandra cluster down"""
+        with self._lock:
+            if self._pg_pool is not None:
+                self._pg_pool.closeall()
+                self._pg_pool = None
+            if self._cluster is not None:
+                self._cluster.shutdown()
+                self._cluster = None
+                self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
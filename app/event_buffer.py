@@ -0,0 +1,74 @@
+from array import array
+
+# Compact state codes shared by the event buffers and both run hour engines
+STATE_OTHER = 0
+STATE_ON = 1
+STATE_OFF = 2
+
+# Raw run_status values seen so far -> state code, so each spelling is normalised once
+_STATE_CODES = {"ON": STATE_ON, "OFF": STATE_OFF}
+_MAX_INTERNED_STATES = 1024
+
+
+def state_code(state):
+    """Map a raw run_status value to STATE_ON, STATE_OFF or STATE_OTHER"""
+    if state is None:
+        return STATE_OTHER
+    state = state.upper().strip()
+    if state == "ON":
+        return STATE_ON
+    if state == "OFF":
+        return STATE_OFF
+    return STATE_OTHER
+
+
+def intern_state(state):
+    """state_code() with the result cached per raw value"""
+    code = _STATE_CODES.get(state)
+    if code is None:
+        code = state_code(state)
+        if len(_STATE_CODES) < _MAX_INTERNED_STATES:
+            _STATE_CODES[state] = code
+    return code
+
+
+class EventBuffer:
+    """
+    Columnar run_status events: int64 epoch milliseconds in an array('q') and one
+    state code byte per event, about 9 bytes per event instead of a tuple, a
+    datetime and a string.
+    """
+
+    __slots__ = ("timestamps", "codes")
+
+    def __init__(self, timestamps=None, codes=None):
+        self.timestamps = timestamps if timestamps is not None else array("q")
+        self.codes = codes if codes is not None else bytearray()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def extend(self, other):
+        self.timestamps.extend(other.timestamps)
+        self.codes += other.codes
+
+    def last_timestamp(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a buffer from (epoch_ms, state) rows"""
+        return cls(
+            array("q", [row[0] for row in rows]),
+            bytearray(map(intern_state, [row[1] for row in rows]))
+        )
+
+
+def event_buffer_row_factory(colnames, rows):
+    """
+    cassandra-driver row_factory for SELECT toUnixTimestamp(datatime), data
+
+    Each result page becomes a single EventBuffer, so iterating the result set
+    yields one buffer per page instead of one row object per event.
+    """
+    return [EventBuffer.from_rows(rows)]
@@ -0,0 +1,179 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from datetime import time as dtime
+from app.metrics import EVENTS_PROCESSED, write_textfile
+from app.cassandra_ops import fetch_logs_for_range, partitions_for_uae_range
+from app.postgres_ops import get_run_hour_state, upsert_live_run_hours
+from app.run_hour_calculation import MILLISECONDS_IN_DAY, ONE_MILLISECOND, RunHourCalculator, uae_tz
+from app.run_hour_vectorized import epoch_ms_to_datetime
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _uae_midnight(day):
+    return datetime.combine(day, dtime.min).replace(tzinfo=uae_tz)
+
+
+def _partition_end(partition_date):
+    return datetime.combine(partition_date + timedelta(days=1), dtime.min).replace(tzinfo=timezone.utc)
+
+
+class LiveAssetTracker:
+    """
+    Incremental run hours of one asset for the current UAE day.
+
+    Each poll reads only the logs newer than the last datatime seen, from the UTC
+    partitions of today that can still hold them, and feeds them to a python-engine
+    RunHourCalculator kept between polls. The partial day is written to
+    run_hours_live with an open ON interval counted up to the poll time. When the
+    UAE day changes, the previous day is read to its end, written as a full day and
+    its open ON interval is carried into the new day.
+    """
+
+    def __init__(self, thingid):
+        self.thingid = thingid
+        self.day = None
+        self.calculator = None
+        self.last_seen = None
+
+    def _start_day(self, pg_conn, day, open_on_start):
+        if open_on_start is None and self.calculator is None:
+            # First poll: continue from the nightly run that closed yesterday, if any
+            state = get_run_hour_state(pg_conn, self.thingid)
+            if state and state['valid_through'] == day - timedelta(days=1):
+                open_on_start = state['open_on_start']
+        self.day = day
+        self.calculator = RunHourCalculator(self.thingid, day, day, engine="python", open_on_start=open_on_start)
+
+    def _read_new_logs(self, cassandra_session, until):
+        """Feed logs of self.day newer than last_seen and before until; returns the number read"""
+        since = _uae_midnight(self.day)
+        after = self.last_seen is not None and self.last_seen >= since
+        if after:
+            since = self.last_seen
+        partitions = [
+            partition_date for partition_date in partitions_for_uae_range(self.day, self.day)
+            if _partition_end(partition_date) > since
+        ]
+
+        def track(pages):
+            for page in pages:
+                if len(page):
+                    self.last_seen = epoch_ms_to_datetime(page.last_timestamp(), timezone.utc)
+                yield page
+
+        new_logs = 0
+        for _, pages in fetch_logs_for_range(
+                cassandra_session, self.thingid, partitions, window=(since, until), after=after, columnar=True):
+            new_logs += self.calculator.add_events(track(pages))
+        return new_logs
+
+    def _record(self, on_ms, off_ms):
+        return {
+            'thingid': self.thingid,
+            'datadate': _uae_midnight(self.day),
+            'on_hours': on_ms,
+            'off_hours': off_ms,
+            'last_datatime': self.last_seen
+        }
+
+    def _close_day(self, cassandra_session, pg_conn):
+        """Read the rest of self.day, store it as a full day and return the open ON interval"""
+        day_end = _uae_midnight(self.day) + timedelta(days=1)
+        self._read_new_logs(cassandra_session, day_end)
+        daily_on_milliseconds, days_with_logs = self.calculator.finish()
+        self.calculator.log_warning_summary()
+        on_ms = daily_on_milliseconds.get(self.day, 0) if self.day in days_with_logs else 0
+        upsert_live_run_hours(pg_conn, self._record(on_ms, MILLISECONDS_IN_DAY - on_ms))
+        logger.info(f"Closed live day {self.day} for {self.thingid}: ON={on_ms}ms")
+        return self.calculator.current_on_start
+
+    def poll(self, cassandra_session, pg_conn, now=None):
+        """
+        Bring the live row of today up to now
+        Returns:
+            dict: The record written to run_hours_live
+        """
+        now = (now or datetime.now(timezone.utc)).astimezone(uae_tz)
+        today = now.date()
+
+        if self.day != today:
+            open_on_start = None
+            if self.calculator is not None:
+                open_on_start = self._close_day(cassandra_session, pg_conn)
+            self._start_day(pg_conn, today, open_on_start)
+
+        new_logs = self._read_new_logs(cassandra_session, now)
+        EVENTS_PROCESSED.inc(new_logs)
+
+        # Same rule as the nightly run: a day without logs counts as 0 ON
+        on_ms = 0
+        if today in self.calculator.days_with_logs:
+            on_ms = self.calculator.partial_on_milliseconds(now).get(today, 0)
+        elapsed_ms = (now - _uae_midnight(today)) // ONE_MILLISECOND
+        record = self._record(on_ms, max(0, elapsed_ms - on_ms))
+
+        upsert_live_run_hours(
+            pg_conn, record,
+            prune_before=_uae_midnight(today - timedelta(days=max(0, settings.LIVE_RETENTION_DAYS - 1)))
+        )
+        logger.debug(f"Live poll {self.thingid}: {new_logs} new logs, ON={on_ms}ms of {elapsed_ms}ms")
+        return record
+
+
+def poll_asset_safely(tracker, connections):
+    """Poll one tracker, logging instead of raising so one asset cannot stop the loop"""
+    try:
+        with connections.postgres() as pg_conn:
+            tracker.poll(connections.cassandra_session, pg_conn)
+        return True
+    except Exception as e:
+        logger.error(f"Live poll failed for {tracker.thingid}: {str(e)}", exc_info=True)
+        return False
+
+
+def run_live(assets, connections, workers=1, poll_interval=None, max_polls=None, metrics_path=None):
+    """
+    Keep today's run hours of every asset current in run_hours_live until interrupted
+
+    Args:
+        assets: Asset dicts as returned by the asset API
+        connections: ConnectionManager shared by the pollers
+        workers: Number of assets polled concurrently
+        poll_interval: Seconds between the starts of two polls (default: settings.LIVE_POLL_INTERVAL)
+        max_polls: Stop after this many polls (default: run until interrupted)
+        metrics_path: Prometheus textfile rewritten after every poll (default: settings.METRICS_TEXTFILE_PATH)
+    Returns:
+        int: Number of failed asset polls in the last poll
+    """
+    poll_interval = poll_interval or settings.LIVE_POLL_INTERVAL
+    trackers = [LiveAssetTracker(asset['identifier']) for asset in assets]
+    logger.info(f"Live mode: polling {len(trackers)} assets every {poll_interval}s with {workers} worker(s)")
+
+    polls = 0
+    failed = 0
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='live-worker') if workers > 1 else None
+    try:
+        while max_polls is None or polls < max_polls:
+            poll_start = time.time()
+            if executor:
+                outcomes = list(executor.map(lambda tracker: poll_asset_safely(tracker, connections), trackers))
+            else:
+                outcomes = [poll_asset_safely(tracker, connections) for tracker in trackers]
+            failed = outcomes.count(False)
+            polls += 1
+
+            elapsed = time.time() - poll_start
+            logger.info(f"Live poll {polls} done in {elapsed:.2f}s ({failed} failed)")
+            write_textfile(metrics_path)
+            if max_polls is None or polls < max_polls:
+                time.sleep(max(0.0, poll_interval - elapsed))
+    except KeyboardInterrupt:
+        logger.info("Live mode interrupted; stopping")
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+    return failed
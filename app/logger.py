@@ -1,14 +1,91 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+
+PLAIN_FORMAT = "[%(asctime)s] %(levelname)s - %(name)s - %(message)s"
+
+_listener = None
 
 def get_logger(name):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
 
     handler = logging.StreamHandler()
-    formatter = logging.Formatter("[%(asctime)s] %(levelname)s - %(name)s - %(message)s")
+    formatter = logging.Formatter(PLAIN_FORMAT)
     handler.setFormatter(formatter)
 
     if not logger.handlers:
         logger.addHandler(handler)
 
     return logger
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the timestamp, level, logger, thread and message"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues records as they are
+
+    The stock prepare() formats the message and exception on the calling thread
+    and drops exc_info and args, which is only needed when records are pickled
+    to another process. The queue here stays in-process, so formatting is left
+    to the listener and JsonFormatter still sees the exception.
+    """
+
+    def prepare(self, record):
+        return record
+
+def configure_logging(mode="plain", json_output=False, level=logging.INFO):
+    """
+    Configure the root logger for a run, replacing any handlers already installed
+
+    Args:
+        mode: 'plain' writes to stderr from the logging thread; 'queue' hands records
+              to a QueueHandler and a background QueueListener does the formatting
+              and stderr writes, so worker threads never block on output
+        json_output: Emit JSON lines instead of the plain text format
+        level: Root logger level
+    """
+    global _listener
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if json_output else logging.Formatter(PLAIN_FORMAT))
+
+    if mode == "queue":
+        records = queue.SimpleQueue()
+        root.addHandler(_RecordQueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        root.addHandler(output)
+    root.setLevel(level)
+
+def stop_logging():
+    """Flush and stop the queue listener, if one is running"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -2,12 +2,26 @@
 
 # new code ........................................
 # Import dependencies
-from app.cassandra_ops import connect_to_cassandra, get_earliest_log_date
-from app.postgres_ops import connect_postgres, get_last_calculated_date
+from app.connections import ConnectionManager
+from app.postgres_ops import connect_postgres, ensure_support_tables, get_last_calculated_dates
 from app.assetfetch import fetch_assets_raw
+from app.asset_cache import is_snapshot_fresh, load_asset_snapshot, save_asset_snapshot, snapshot_age_seconds
 from app.run_hour_calculation import process_asset_for_date
+from app.run_journal import RunJournal
+from app.read_scheduler import ReadScheduler
+from app.planner import build_work_plan, log_plan
+from app.live_mode import run_live
+from app.logger import configure_logging
+from app.metrics import (
+    ASSET_FETCH_SECONDS, ASSET_SECONDS, RUN_ASSETS, RUN_DURATION_SECONDS, RUN_LAST_COMPLETION,
+    set_const_labels, write_textfile
+)
+from app.sharding import parse_shard_spec, run_shard_processes, select_shard, shard_path, sub_shards
+from config.settings import settings
 from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import sys
+import json
 import logging
 import argparse
 import time  # For execution timing
@@ -31,18 +45,83 @@ def parse_date(date_str):
         logger.error(f"Invalid date format: {date_str}. Use YYYY-MM-DD.")
         sys.exit(1)
 
-def get_date_range_from_args():
+def build_arg_parser():
+    """Build the command line parser for the run hour job"""
+    parser = argparse.ArgumentParser(description='Process run hours for assets')
+    parser.add_argument('dates', nargs='*', help='Date range to process (start_date end_date)')
+    parser.add_argument('--force', action='store_true', help='Force reprocessing of all dates in range')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of assets processed concurrently (default: 1)')
+    parser.add_argument('--refresh-assets', action='store_true',
+                        help='Ignore the asset snapshot TTL and fetch the asset list from the API')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip assets and ranges recorded as done in the run journal of an interrupted run')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default=None,
+                        help='Run hour calculation engine (default: RUN_HOUR_ENGINE setting)')
+    parser.add_argument('--scheduler', choices=['asset', 'global'], default=settings.READ_SCHEDULER,
+                        help='asset: each worker reads and calculates one asset at a time; global: plan every '
+                             'asset first and keep a fleet-wide window of partition reads in flight '
+                             '(default: READ_SCHEDULER setting)')
+    parser.add_argument('--read-window', type=int, default=settings.READ_SCHEDULER_WINDOW,
+                        help='Partition reads in flight with --scheduler global (default: READ_SCHEDULER_WINDOW setting)')
+    parser.add_argument('--plan-only', action='store_true',
+                        help='Log the merged work plan with the partitions to read and rows to write, '
+                             'then exit without calculating (planned in one process, ignoring --processes)')
+    parser.add_argument('--live', action='store_true',
+                        help="Keep today's partial run hours current in run_hours_live until interrupted")
+    parser.add_argument('--poll-interval', type=int, default=None,
+                        help='Seconds between live polls (default: LIVE_POLL_INTERVAL setting)')
+    parser.add_argument('--shard', default=None,
+                        help='Only process the assets of shard K of N (K/N, by a stable hash of the identifier)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Split the run (or its --shard) across P child processes (default: 1)')
+    parser.add_argument('--summary-json', default=None,
+                        help='Write the run summary counts to this JSON file')
+    # Set on --processes children: the parent has already created the support tables
+    parser.add_argument('--skip-support-tables', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--log-mode', choices=['plain', 'queue'], default=settings.LOG_MODE,
+                        help='plain: write log lines directly; queue: write them from a background '
+                             'thread via QueueHandler/QueueListener (default: LOG_MODE setting)')
+    parser.add_argument('--log-json', action='store_true', default=settings.LOG_JSON,
+                        help='Write logs as JSON lines (default: LOG_JSON setting)')
+    return parser
+
+def build_child_argv(args, shard_spec, summary_path):
+    """Command line of a --processes child: the parent's options for one shard"""
+    argv = list(args.dates) + [
+        '--workers', str(args.workers),
+        '--shard', shard_spec,
+        '--summary-json', summary_path,
+        '--skip-support-tables'
+    ]
+    if args.force:
+        argv.append('--force')
+    if args.resume:
+        argv.append('--resume')
+    if args.engine:
+        argv += ['--engine', args.engine]
+    argv += ['--scheduler', args.scheduler, '--read-window', str(args.read_window)]
+    if args.live:
+        argv.append('--live')
+    if args.poll_interval:
+        argv += ['--poll-interval', str(args.poll_interval)]
+    argv += ['--log-mode', args.log_mode]
+    if args.log_json:
+        argv.append('--log-json')
+    return argv
+
+def get_date_range_from_args(args=None):
     """
     Parse command line arguments for date range processing
+    Args:
+        args: Already parsed arguments (parsed from sys.argv when omitted)
     Returns:
         tuple: (start_date, end_date, force_update, single_date_mode)
         None values indicate default behavior should be used
         single_date_mode: boolean indicating if user specified exactly one date
     """
-    parser = argparse.ArgumentParser(description='Process run hours for assets')
-    parser.add_argument('dates', nargs='*', help='Date range to process (start_date end_date)')
-    parser.add_argument('--force', action='store_true', help='Force reprocessing of all dates in range')
-    args = parser.parse_args()
+    if args is None:
+        args = build_arg_parser().parse_args()
 
     force_update = args.force
     single_date_mode = False
@@ -62,23 +141,48 @@ def get_date_range_from_args():
             sys.exit(1)
         return start, end, force_update, single_date_mode
     else:
-        logger.error("Invalid arguments. Usage: python main.py [start_date] [end_date] [--force]")
+        logger.error("Invalid arguments. Usage: python main.py [start_date] [end_date] [--force] [--workers N]")
         sys.exit(1)
 
-def handle_asset_fetching():
+FALLBACK_ASSET = {
+    "identifier": "AC_001",
+    "displayName": "Fallback Asset",
+    "operationStatus": "ACTIVE",
+    "communicationStatus": "COMMUNICATING",
+    "TimeReference": 1746053925000,
+    "is_fallback": True  # Mark as fallback
+}
+
+def handle_asset_fetching(refresh=False):
     """
-    Fetch and validate assets with error handling
+    Fetch and validate assets with error handling, backed by the local asset snapshot
+    Args:
+        refresh: Ignore the snapshot TTL and always ask the API
     Returns:
-        dict: Returns full asset data structure on success, or fallback asset on failure
+        dict: Returns full asset data structure on success, or fallback assets on failure
               Format: {
                   'success': bool,
                   'assets': list[dict],  # Full asset data when successful
-                  'fallback_used': bool,  # True when using fallback
+                  'fallback_used': bool,  # True when using the stale snapshot or AC_001
+                  'source': str,  # 'cache', 'api', 'stale_cache' or 'fallback'
                   'error': str  # Only present on failure
               }
     """
     start_time = time.time()
-    asset_result = fetch_assets_raw()
+    snapshot = load_asset_snapshot()
+
+    # A fresh snapshot skips the API round trip entirely
+    if snapshot and not refresh and is_snapshot_fresh(snapshot):
+        logger.info(
+            f"Using cached asset snapshot with {len(snapshot['assets'])} assets "
+            f"({snapshot_age_seconds(snapshot):.0f}s old)"
+        )
+        return {'success': True, 'fallback_used': False, 'source': 'cache', 'assets': snapshot['assets']}
+
+    asset_result = fetch_assets_raw(
+        etag=snapshot['etag'] if snapshot else None,
+        time_retrieved=snapshot['time_retrieved'] if snapshot else None
+    )
     
     # Prepare base response structure
     response = {
@@ -91,154 +195,318 @@ def handle_asset_fetching():
         logger.error(f"Asset fetch failed: {asset_result['error']}")
         response['error'] = asset_result['error']
         response['fallback_used'] = True
+
+        if snapshot:
+            logger.warning(
+                f"Serving last good asset snapshot ({len(snapshot['assets'])} assets, "
+                f"{snapshot_age_seconds(snapshot) / 3600:.1f}h old)"
+            )
+            response['source'] = 'stale_cache'
+            response['assets'] = snapshot['assets']
+            return response
         
         if asset_result.get('retryable', False):
-            logger.warning("Retryable error - using fallback asset AC_001")
+            logger.warning("Retryable error and no asset snapshot - using fallback asset AC_001")
         else:
-            logger.error("Non-retryable error - using fallback asset AC_001")
+            logger.error("Non-retryable error and no asset snapshot - using fallback asset AC_001")
         
         # Return fallback with same structure as successful response
-        response['assets'] = [{
-            "identifier": "AC_001",
-            "displayName": "Fallback Asset",
-            "operationStatus": "ACTIVE",
-            "communicationStatus": "COMMUNICATING",
-            "TimeReference": 1746053925000,
-            "is_fallback": True  # Mark as fallback
-        }]
+        response['source'] = 'fallback'
+        response['assets'] = [dict(FALLBACK_ASSET)]
+        return response
+
+    if asset_result.get('not_modified'):
+        logger.info(f"Asset list not modified; refreshed snapshot in {time.time() - start_time:.2f}s")
+        try:
+            save_asset_snapshot(snapshot['assets'], asset_result['data']['time_retrieved'], snapshot['etag'])
+        except OSError as e:
+            logger.warning(f"Could not save asset snapshot: {e}")
+        response['source'] = 'cache'
+        response['assets'] = snapshot['assets']
         return response
     
-    # On success, return all asset data
-    logger.info(f"Fetched {asset_result['data']['filtered_count']} assets in {time.time() - start_time:.2f}s")
-    response['assets'] = asset_result['data']['assets']
+    # On success, save the snapshot and return all asset data
+    data = asset_result['data']
+    logger.info(
+        f"Fetched {data['count']} assets in {len(data['pages'])} pages "
+        f"in {time.time() - start_time:.2f}s"
+    )
+    try:
+        save_asset_snapshot(data['assets'], data['time_retrieved'], data.get('etag'))
+    except OSError as e:
+        logger.warning(f"Could not save asset snapshot: {e}")
+    response['source'] = 'api'
+    response['assets'] = data['assets']
     return response
 
+def run_calculation_unit(journal, thingid, cassandra_session, pg_conn, start_date, end_date,
+                         force_update, engine=None):
+    """Run process_asset_for_date for one (thingid, range) unit unless the journal has it as done"""
+    if journal and journal.unit_done(thingid, start_date, end_date, force_update):
+        logger.info(f"Skipping {thingid} from {start_date} to {end_date}: completed by an earlier run")
+        return
+    process_asset_for_date(
+        thingid,
+        cassandra_session,
+        pg_conn,
+        start_date,
+        end_date,
+        force_update,
+        engine=engine
+    )
+    if journal:
+        journal.record_unit(thingid, start_date, end_date, force_update)
+
+def run_plan(plan, cassandra_session, pg_conn, engine=None, journal=None):
+    """
+    Calculate every range of one asset's plan
+    Args:
+        plan: plan_asset result
+        cassandra_session: Shared Cassandra session
+        pg_conn: PostgreSQL connection owned by the calling worker
+        engine: Run hour engine passed to process_asset_for_date
+        journal: Optional RunJournal recording completed ranges
+    Returns:
+        dict: {'thingid', 'status', 'detail'} where status is 'processed' or 'skipped'
+    Raises any processing error so the caller can record the asset as failed
+    """
+    thingid = plan['thingid']
+    # A skipped plan may still carry a backfill range, which is calculated before skipping
+    for calc_start, calc_end, unit_force in plan['units']:
+        logger.info(f"Calculating run hours for {thingid} from {calc_start} to {calc_end}")
+        run_calculation_unit(
+            journal,
+            thingid,
+            cassandra_session,
+            pg_conn,
+            calc_start,
+            calc_end,
+            unit_force,
+            engine
+        )
+    status = 'processed' if plan['status'] == 'planned' else plan['status']
+    return {'thingid': thingid, 'status': status, 'detail': plan['detail']}
+
+def run_plan_safely(plan, connections, engine=None, journal=None):
+    """
+    Run run_plan with failure isolation and timing
+    Args:
+        plan: plan_asset_safely result; a 'failed' plan is reported as a failed asset
+        connections: ConnectionManager to borrow the Cassandra session and a PostgreSQL connection from
+        engine: Run hour engine
+        journal: Optional RunJournal recording completed ranges and assets
+    Returns:
+        dict: Per-asset result with 'elapsed' seconds (planning included); status is 'failed' on any error
+    """
+    asset_start = time.time()
+    thingid = plan['thingid']
+    if plan['status'] == 'failed':
+        result = {'thingid': thingid, 'status': 'failed', 'detail': plan['detail']}
+    else:
+        try:
+            with connections.postgres() as pg_conn:
+                result = run_plan(plan, connections.cassandra_session, pg_conn, engine, journal)
+            if journal:
+                journal.record_asset(thingid, result['status'])
+        except Exception as e:
+            logger.error(f"Asset {thingid} failed: {str(e)}", exc_info=True)
+            result = {'thingid': thingid, 'status': 'failed', 'detail': str(e)}
+    result['elapsed'] = plan['elapsed'] + time.time() - asset_start
+    ASSET_SECONDS.observe(result['elapsed'], status=result['status'])
+    return result
+
+def skip_completed_assets(assets, journal):
+    """
+    Split off the assets the journal has as done by an earlier run
+    Returns:
+        tuple: (skipped results, assets still to plan)
+    """
+    skipped = []
+    to_plan = []
+    for asset in assets:
+        if journal and journal.asset_done(asset['identifier']):
+            skipped.append({'thingid': asset['identifier'], 'status': 'skipped',
+                            'detail': 'completed by an earlier run', 'elapsed': 0.0})
+        else:
+            to_plan.append(asset)
+    return skipped, to_plan
+
+def count_results(results):
+    """Count per-asset results by status"""
+    counts = {'assets': len(results), 'processed': 0, 'skipped': 0, 'failed': 0}
+    for result in results:
+        counts[result['status']] += 1
+    return counts
+
+def log_run_summary(results):
+    """
+    Log a per-asset summary of the run
+    Args:
+        results: List of per-asset result dicts
+    Returns:
+        int: Number of failed assets
+    """
+    counts = count_results(results)
+
+    logger.info(
+        f"Run summary: {len(results)} assets - {counts['processed']} processed, "
+        f"{counts['skipped']} skipped, {counts['failed']} failed"
+    )
+    for result in results:
+        log = logger.error if result['status'] == 'failed' else logger.info
+        log(f"  {result['thingid']}: {result['status']} ({result['detail']}) in {result['elapsed']:.2f}s")
+    return counts['failed']
+
 def main():
     """Main execution flow for run hour calculation"""
     start_time = time.time()
-    
-    # Initialize database connections
-    cassandra_session = connect_to_cassandra()
-    pg_conn = connect_postgres()
-    
+    failed_assets = 0
+
+    # 1. Parse command line arguments
+    args = build_arg_parser().parse_args()
+    configure_logging(args.log_mode, args.log_json, settings.LOG_LEVEL.upper())
+    user_start, user_end, force_update, single_date_mode = get_date_range_from_args(args)
+    workers = max(1, args.workers)
+    yesterday = date.today() - timedelta(days=1)
     try:
-        # 1. Parse command line arguments
-        user_start, user_end, force_update, single_date_mode = get_date_range_from_args()
-        yesterday = date.today() - timedelta(days=1)
+        shard = parse_shard_spec(args.shard) if args.shard else None
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    if args.processes > 1 and not args.plan_only:
+        # Create the support tables once; concurrent CREATE ... IF NOT EXISTS from every
+        # child can still fail on the catalog's unique indexes
+        try:
+            pg_conn = connect_postgres()
+            try:
+                ensure_support_tables(pg_conn)
+            finally:
+                pg_conn.close()
+        except Exception as e:
+            logger.error(f"Could not create the support tables for the shard processes: {str(e)}")
+            sys.exit(1)
+        # Refresh the asset snapshot once so the children read it instead of calling the API
+        handle_asset_fetching(refresh=args.refresh_assets)
+        exit_code = run_shard_processes(
+            sub_shards(*(shard or (0, 1)), args.processes),
+            lambda shard_spec, summary_path: build_child_argv(args, shard_spec, summary_path)
+        )
+        logger.info(f"Processing complete. Total time: {time.time() - start_time:.2f}s")
+        sys.exit(exit_code)
+
+    # Initialize database connections. The Cassandra session is shared; each worker
+    # borrows a PostgreSQL connection from the pool for the duration of one asset.
+    connections = ConnectionManager(pg_maxconn=max(settings.POSTGRES_POOL_MAX, workers + 1))
+    journal = None
+    metrics_path = settings.METRICS_TEXTFILE_PATH
+    if shard:
+        # node_exporter rejects the same series from two textfiles, so each shard labels its own
+        set_const_labels(shard=f"{shard[0]}/{shard[1]}")
+        if metrics_path:
+            metrics_path = shard_path(metrics_path, *shard)
+
+    try:
+        # Connect to Cassandra up front so an unreachable cluster fails the run once, not per asset
+        connections.cassandra_session
 
         # 2. Fetch assets to process
-        asset_response = handle_asset_fetching()
-        
+        fetch_started = time.time()
+        asset_response = handle_asset_fetching(refresh=args.refresh_assets)
+        ASSET_FETCH_SECONDS.set(time.time() - fetch_started, source=asset_response['source'])
+
         if not asset_response['success']:
             logger.warning(f"Using fallback assets due to: {asset_response.get('error', 'Unknown error')}")
-        
+
         assets = asset_response['assets']
-        logger.info(f"Processing {len(assets)} assets (fallback used: {asset_response['fallback_used']})")
-        
-        # 3. Process each asset
-        for asset in assets:
-            thingid = asset['identifier']
-            logger.info(f"Processing {thingid} (force={force_update})")
-            
-            # Get createdOn date if available
-            created_date = None
-            if 'createdOn' in asset and asset['createdOn']:
-                try:
-                    created_date = datetime.fromtimestamp(asset['createdOn']/1000).date()
-                    logger.debug(f"Asset {thingid} created on {created_date}")
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Invalid createdOn timestamp for {thingid}: {e}")
-
-            # Determine calculation range based on mode
-            if force_update:
-                if user_start is None:
-                    calc_start = calc_end = yesterday
-                else:
-                    calc_start = user_start
-                    calc_end = user_end or user_start
+        if shard:
+            total_assets = len(assets)
+            assets = select_shard(assets, *shard)
+            logger.info(f"Shard {args.shard} owns {len(assets)} of {total_assets} assets")
+        logger.info(
+            f"Processing {len(assets)} assets with {workers} worker(s) "
+            f"(source: {asset_response['source']}, fallback used: {asset_response['fallback_used']})"
+        )
+
+        if not args.skip_support_tables:
+            with connections.postgres() as pg_conn:
+                ensure_support_tables(pg_conn)
+
+        if args.live:
+            run_live(assets, connections, workers, args.poll_interval, metrics_path=metrics_path)
+            return
+
+        if not args.plan_only:
+            # Checkpoint journal, keyed on the arguments so --resume never mixes different runs
+            run_key = {'dates': args.dates, 'force': force_update, 'yesterday': yesterday.isoformat(),
+                       'shard': args.shard}
+            journal_path = shard_path(settings.RUN_JOURNAL_PATH, *shard) if shard else None
+            journal = RunJournal(run_key, path=journal_path, resume=args.resume)
+
+        # 3. Look up the last calculated date of every asset in one query
+        last_calculated_dates = {}
+        if not force_update:
+            with connections.postgres() as pg_conn:
+                last_calculated_dates = get_last_calculated_dates(
+                    pg_conn, [asset['identifier'] for asset in assets]
+                )
+            logger.info(f"Loaded last calculated dates for {len(last_calculated_dates)} assets")
+
+        plan_options = {
+            'user_start': user_start,
+            'user_end': user_end,
+            'force_update': force_update,
+            'single_date_mode': single_date_mode,
+            'yesterday': yesterday,
+            'last_calculated_dates': last_calculated_dates,
+        }
+        if args.plan_only:
+            # 4. Plan every asset and report the size of the work without calculating
+            summary = log_plan(build_work_plan(assets, connections, workers, **plan_options))
+            failed_assets = summary['failed']
+        else:
+            # 4. Plan every asset not completed by an earlier run, then calculate the plans,
+            # isolating failures per asset
+            results, to_plan = skip_completed_assets(assets, journal)
+            plans = build_work_plan(to_plan, connections, workers, **plan_options)
+            if args.scheduler == 'global':
+                scheduler = ReadScheduler(
+                    connections, window=args.read_window, workers=workers, engine=args.engine, journal=journal
+                )
+                results += scheduler.run(plans)
+            elif workers == 1:
+                results += [run_plan_safely(plan, connections, args.engine, journal) for plan in plans]
             else:
-                last_calculated = get_last_calculated_date(pg_conn, thingid)
-                last_date = last_calculated.date() if last_calculated else None
-
-                if user_start is None:
-                    # Default mode - calculate up to yesterday
-                    calc_end = yesterday
-                    if last_date:
-                        calc_start = last_date + timedelta(days=1)
-                    else:
-                        # Pass created_date to optimize search
-                        calc_start = get_earliest_log_date(
-                            cassandra_session, 
-                            thingid,
-                            created_date=created_date,
-                            scan_end=calc_end
-                        )
-                        if not calc_start:
-                            logger.warning(f"No logs found for {thingid}")
-                            continue
-                else:
-                    # User specified date(s)
-                    calc_end = user_end or user_start
-                    
-                    if single_date_mode:
-                        # Special handling for single date mode
-                        if last_date:
-                            calc_start = last_date + timedelta(days=1)
-                            if calc_start > calc_end:
-                                logger.info(f"Nothing to calculate for {thingid} (last calculated {last_date})")
-                                continue
-                        else:
-                            # No previous calculation - find earliest logs
-                            calc_start = get_earliest_log_date(
-                                cassandra_session,
-                                thingid,
-                                created_date=created_date,
-                                scan_end=calc_end
-                            )
-                            if not calc_start:
-                                logger.warning(f"No logs found for {thingid}")
-                                continue
-                            calc_start = min(calc_start, calc_end)
-                    else:
-                        # Date range mode - always respect user's requested range
-                        calc_start = user_start
-                        # Check if we need to backfill from last calculated date
-                        if last_date and last_date + timedelta(days=1) < user_start:
-                            backfill_start = last_date + timedelta(days=1)
-                            backfill_end = user_start - timedelta(days=1)
-                            if backfill_start <= backfill_end:
-                                logger.info(f"Backfilling gap for {thingid} from {backfill_start} to {backfill_end}")
-                                process_asset_for_date(
-                                    thingid, 
-                                    cassandra_session, 
-                                    pg_conn, 
-                                    backfill_start, 
-                                    backfill_end, 
-                                    False
-                                )
-
-            if calc_start > calc_end:
-                logger.info(f"Nothing to calculate for {thingid} in given range.")
-                continue
-
-            logger.info(f"Calculating run hours for {thingid} from {calc_start} to {calc_end}")
-            process_asset_for_date(
-                thingid, 
-                cassandra_session, 
-                pg_conn, 
-                calc_start, 
-                calc_end, 
-                force_update
-            )
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asset-worker') as executor:
+                    results += executor.map(
+                        lambda plan: run_plan_safely(plan, connections, args.engine, journal),
+                        plans
+                    )
+
+            failed_assets = log_run_summary(results)
+            summary = count_results(results)
+            for status in ('processed', 'skipped', 'failed'):
+                RUN_ASSETS.set(summary[status], status=status)
+            RUN_LAST_COMPLETION.set(time.time())
+        if args.summary_json:
+            with open(args.summary_json, "w", encoding="utf-8") as summary_file:
+                json.dump(dict(summary, shard=args.shard), summary_file)
 
     except Exception as e:
         logger.error(f"Critical error in main execution: {str(e)}", exc_info=True)
         sys.exit(1)
     finally:
-        pg_conn.close()
-        cassandra_session.shutdown()
+        if journal:
+            journal.close()
+        connections.close()
+        if not args.plan_only:
+            RUN_DURATION_SECONDS.set(time.time() - start_time)
+            write_textfile(metrics_path)
         logger.info(f"Processing complete. Total time: {time.time() - start_time:.2f}s")
 
+    if failed_assets:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,201 @@
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers single partition reads up to whole-asset ranges
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+# Labels added to every series, e.g. the shard, so the textfiles of parallel runs stay distinct
+_const_labels = []
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + _const_labels + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class: a named metric with fixed label names, registered for the textfile"""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; its _count doubles as the number of observed calls"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_sample(self, key, value):
+        bucket_counts, total, count = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', _format_value(bound))])} {bucket_count}"
+            for bound, bucket_count in zip(self.buckets, bucket_counts)
+        ]
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def instrument(histogram, **labels):
+    """Decorator observing the wall time of every call of the wrapped function in histogram"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+ASSET_FETCH_SECONDS = Gauge(
+    "run_hours_asset_fetch_seconds", "Time spent obtaining the asset list in the last run", ["source"]
+)
+CASSANDRA_QUERY_SECONDS = Histogram(
+    "run_hours_cassandra_query_seconds", "Latency of Cassandra reads by query", ["query"]
+)
+EVENTS_PROCESSED = Counter(
+    "run_hours_events_processed_total", "run_status log rows fed to the run hour calculation"
+)
+POSTGRES_OPERATION_SECONDS = Histogram(
+    "run_hours_postgres_operation_seconds", "Latency of PostgreSQL operations by operation", ["operation"]
+)
+POSTGRES_ROWS_WRITTEN = Counter(
+    "run_hours_postgres_rows_written_total", "run_hours rows upserted"
+)
+ASSET_SECONDS = Histogram(
+    "run_hours_asset_seconds", "Wall time per asset by outcome", ["status"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+RUN_ASSETS = Gauge("run_hours_run_assets", "Assets of the last run by outcome", ["status"])
+RUN_DURATION_SECONDS = Gauge("run_hours_run_duration_seconds", "Wall time of the last run")
+RUN_LAST_COMPLETION = Gauge(
+    "run_hours_run_last_completion_timestamp_seconds", "Unix time at which the last run finished"
+)
+
+
+def set_const_labels(**labels):
+    """Set labels written on every series of every metric, e.g. set_const_labels(shard="0/4")"""
+    with _registry_lock:
+        _const_labels[:] = sorted(labels.items())
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None):
+    """
+    Write all metrics for the node exporter textfile collector
+
+    The file is written next to its destination and renamed into place, so the
+    collector never reads a partial file.
+
+    Args:
+        path: Output path (default: settings.METRICS_TEXTFILE_PATH); nothing is written when empty
+    """
+    path = path or settings.METRICS_TEXTFILE_PATH
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(render_metrics())
+        os.replace(tmp_path, path)
+        logger.info(f"Wrote metrics to {path}")
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {path}: {e}")
@@ -30,7 +30,13 @@
 from flask import Flask, request, jsonify
 import requests
 import os
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 
@@ -40,6 +46,204 @@ app = Flask(__name__)
 MOCK_API_TOKEN = os.getenv("MOCK_API_TOKEN")  # Token clients use to access YOUR mock
 REAL_API_URL = os.getenv("REAL_API_URL")      # e.g., "https://real-api.example.com/endpoint"
 REAL_API_TOKEN = os.getenv("REAL_API_TOKEN")  # Token to access the real API
+UPSTREAM_POOL_SIZE = int(os.getenv("MOCK_API_POOL_SIZE", "16"))  # Keep-alive connections to the real API
+CACHE_TTL = float(os.getenv("MOCK_API_CACHE_TTL", "5"))          # Seconds a 2xx response is reused (0 disables)
+CACHE_MAX_ENTRIES = int(os.getenv("MOCK_API_CACHE_MAX_ENTRIES", "1024"))
+
+# Synthetic backend for offline load tests: MOCK_API_BACKEND=synthetic serves generated assets
+BACKEND = os.getenv("MOCK_API_BACKEND", "proxy")                  # "proxy" or "synthetic"
+SYNTHETIC_ASSETS = int(os.getenv("MOCK_API_ASSETS", "50000"))     # Fleet size
+SYNTHETIC_SEED = int(os.getenv("MOCK_API_SEED", "42"))            # Same seed and size -> same fleet
+SYNTHETIC_LATENCY = float(os.getenv("MOCK_API_LATENCY", "0"))     # Seconds added to every response
+SYNTHETIC_ERROR_RATE = float(os.getenv("MOCK_API_ERROR_RATE", "0"))  # Share of requests answered 503
+
+_upstream_session = None
+_upstream_lock = threading.Lock()
+
+# Identical requests share one upstream call (in flight) and its response (for CACHE_TTL seconds)
+_in_flight = {}
+_cache = {}
+_requests_lock = threading.Lock()
+
+
+def get_upstream_session():
+    """Shared keep-alive session to the real API, created on first use"""
+    global _upstream_session
+    with _upstream_lock:
+        if _upstream_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, UPSTREAM_POOL_SIZE))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                'Authorization': f'Bearer {REAL_API_TOKEN}',
+                'Content-Type': 'application/json'
+            })
+            _upstream_session = session
+        return _upstream_session
+
+
+class _UpstreamCall:
+    """One upstream request; callers arriving while it runs wait for its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def request_key(payload, params):
+    """Cache/coalescing key: the JSON body with sorted keys plus the sorted query parameters"""
+    return (
+        json.dumps(payload, sort_keys=True, separators=(",", ":")),
+        tuple(sorted(params.items(multi=True))) if hasattr(params, "items") else ()
+    )
+
+
+def forward_request(payload, params):
+    """
+    POST the payload to the real API, sharing the call with identical concurrent requests
+    Returns:
+        tuple: ((response JSON, status code), source) where source is 'hit', 'coalesced' or 'miss'
+    Raises requests.exceptions.RequestException (also to coalesced callers) on upstream failure
+    """
+    key = request_key(payload, params)
+    with _requests_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], 'hit'
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _in_flight[key] = _UpstreamCall()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, 'coalesced'
+
+    try:
+        response = get_upstream_session().post(
+            REAL_API_URL,
+            json=payload,
+            params=params,
+            timeout=10  # Important for production
+        )
+        call.result = (response.json(), response.status_code)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _requests_lock:
+            del _in_flight[key]
+            if call.error is None and CACHE_TTL > 0 and 200 <= call.result[1] < 300:
+                now = time.monotonic()
+                if len(_cache) >= CACHE_MAX_ENTRIES:
+                    for expired in [k for k, (expires_at, _) in _cache.items() if expires_at <= now]:
+                        del _cache[expired]
+                    while len(_cache) >= CACHE_MAX_ENTRIES:
+                        del _cache[next(iter(_cache))]
+                _cache[key] = (now + CACHE_TTL, call.result)
+        call.done.set()
+    return call.result, 'miss'
+
+
+# (value, weight) choices for the generated status fields
+_OPERATION_STATUSES = [("ACTIVE", 85), ("Running", 5), ("INACTIVE", 7), ("MAINTENANCE", 3)]
+_COMMUNICATION_STATUSES = [("COMMUNICATING", 92), ("NOT_COMMUNICATING", 8)]
+_CREATED_FROM = int(datetime(2019, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+_CREATED_UNTIL = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+_synthetic_fleet = None
+_synthetic_views = {}
+_synthetic_lock = threading.Lock()
+_fault_random = random.Random(SYNTHETIC_SEED)
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def synthetic_fleet(count, seed=SYNTHETIC_SEED):
+    """
+    The first `count` assets of the synthetic fleet
+
+    Assets are drawn in index order from one seeded generator, so the same seed always
+    gives the same fleet and a larger fleet only adds assets to a smaller one.
+    """
+    rng = random.Random(seed)
+    fleet = []
+    for index in range(count):
+        identifier = f"AC_{index:05d}"
+        fleet.append({
+            "identifier": identifier,
+            "thingCode": identifier,
+            "displayName": f"F-{identifier}",
+            "domain": "lremcofc",
+            "createdOn": rng.randrange(_CREATED_FROM, _CREATED_UNTIL),
+            "operationStatus": _weighted(rng, _OPERATION_STATUSES),
+            "communicationStatus": _weighted(rng, _COMMUNICATION_STATUSES)
+        })
+    return fleet
+
+
+def synthetic_assets(payload):
+    """
+    The synthetic fleet narrowed by the payload's operationStatus / communicationStatus
+    lists, like the real filter endpoint; each filtered view is built once
+    """
+    global _synthetic_fleet
+    filters = tuple(
+        (field, tuple(sorted(payload[field])))
+        for field in ("operationStatus", "communicationStatus")
+        if isinstance(payload.get(field), list)
+    )
+    with _synthetic_lock:
+        if _synthetic_fleet is None:
+            _synthetic_fleet = synthetic_fleet(SYNTHETIC_ASSETS)
+        view = _synthetic_views.get(filters)
+        if view is None:
+            view = _synthetic_views[filters] = [
+                asset for asset in _synthetic_fleet
+                if all(asset[field] in allowed for field, allowed in filters)
+            ]
+        return view
+
+
+def synthetic_response(payload):
+    """Serve one page of the synthetic fleet; offset is the 1-based page number"""
+    if SYNTHETIC_LATENCY > 0:
+        time.sleep(SYNTHETIC_LATENCY)
+    with _synthetic_lock:
+        fail = SYNTHETIC_ERROR_RATE > 0 and _fault_random.random() < SYNTHETIC_ERROR_RATE
+    if fail:
+        return jsonify({"error": "Injected synthetic failure"}), 503
+
+    try:
+        offset = int(payload.get("offset", 1))
+        page_size = int(payload.get("pageSize", 100))
+    except (TypeError, ValueError):
+        return jsonify({"error": "offset and pageSize must be integers"}), 400
+    if offset < 1 or page_size < 1:
+        return jsonify({"error": "offset and pageSize must be positive"}), 400
+
+    etag = f'"synthetic-{SYNTHETIC_SEED}-{SYNTHETIC_ASSETS}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
+
+    assets = synthetic_assets(payload)
+    start = (offset - 1) * page_size
+    return jsonify({
+        "data": {
+            "assets": assets[start:start + page_size],
+            "total": len(assets),
+            "offset": offset,
+            "pageSize": page_size
+        }
+    }), 200, {'ETag': etag}
+
 
 @app.route('/platform-asset-1.0.0/latest/filter/access', methods=['POST'])
 def get_assets():
@@ -48,24 +252,16 @@ def get_assets():
     if not auth_header or auth_header != f"Bearer {MOCK_API_TOKEN}":
         return jsonify({"error": "Unauthorized"}), 401
 
+    if BACKEND == 'synthetic':
+        return synthetic_response(request.get_json(silent=True) or {})
+
     # 2. Forward request to real API
     try:
-        headers = {
-            'Authorization': f'Bearer {REAL_API_TOKEN}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Forward all original data (payload + query params)
-        response = requests.post(
-            REAL_API_URL,
-            headers=headers,
-            json=request.get_json(),
-            params=request.args,
-            timeout=10  # Important for production
-        )
-        
+        # Forward all original data (payload + query params); identical requests share one call
+        (body, status_code), source = forward_request(request.get_json(), request.args)
+
         # 3. Return real API's response exactly
-        return jsonify(response.json()), response.status_code
+        return jsonify(body), status_code, {'X-Proxy-Cache': source.upper()}
 
     except requests.exceptions.Timeout:
         return jsonify({"error": "Real API timeout"}), 504
@@ -73,4 +269,4 @@ def get_assets():
         return jsonify({"error": f"Real API error: {str(e)}"}), 502
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8080, threaded=True)
@@ -0,0 +1,194 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.cassandra_ops import get_earliest_log_date, partitions_for_uae_range
+
+logger = logging.getLogger(__name__)
+
+def merge_units(units):
+    """
+    Merge (start_date, end_date, force_update) ranges with the same force flag that overlap
+    or touch, so the ranges of one asset are read and written once; plan_asset never
+    produces overlapping ranges with different flags
+    """
+    merged = []
+    for start_date, end_date, force_update in sorted(units):
+        if merged and merged[-1][2] == force_update and start_date <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_date), force_update)
+        else:
+            merged.append((start_date, end_date, force_update))
+    return merged
+
+def plan_asset(asset, cassandra_session, user_start, user_end, force_update, single_date_mode, yesterday,
+               last_calculated_dates):
+    """
+    Determine the calculation ranges of one asset without calculating anything
+    Args:
+        asset: Asset dict as returned by the asset API
+        cassandra_session: Shared Cassandra session, used to find the earliest logs of new assets
+        user_start, user_end, force_update, single_date_mode: Parsed command line options
+        yesterday: Default end date for the run
+        last_calculated_dates: {thingid: last calculated datadate} for the whole fleet
+    Returns:
+        dict: {'thingid', 'status', 'detail', 'units'} where status is 'planned' or 'skipped' and
+              units lists the non-overlapping (start_date, end_date, force_update) ranges to
+              calculate in order; a backfill gap is merged into the range that follows it
+              unless that range is forced
+    """
+    thingid = asset['identifier']
+    logger.info(f"Planning {thingid} (force={force_update})")
+    units = []
+
+    # Get createdOn date if available
+    created_date = None
+    if 'createdOn' in asset and asset['createdOn']:
+        try:
+            created_date = datetime.fromtimestamp(asset['createdOn']/1000).date()
+            logger.debug(f"Asset {thingid} created on {created_date}")
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid createdOn timestamp for {thingid}: {e}")
+
+    # Determine calculation range based on mode
+    if force_update:
+        if user_start is None:
+            calc_start = calc_end = yesterday
+        else:
+            calc_start = user_start
+            calc_end = user_end or user_start
+    else:
+        last_calculated = last_calculated_dates.get(thingid)
+        last_date = last_calculated.date() if last_calculated else None
+
+        if user_start is None:
+            # Default mode - calculate up to yesterday
+            calc_end = yesterday
+            if last_date:
+                calc_start = last_date + timedelta(days=1)
+            else:
+                # Pass created_date to optimize search
+                calc_start = get_earliest_log_date(
+                    cassandra_session,
+                    thingid,
+                    created_date=created_date,
+                    scan_end=calc_end
+                )
+                if not calc_start:
+                    logger.warning(f"No logs found for {thingid}")
+                    return {'thingid': thingid, 'status': 'skipped', 'detail': 'no logs found', 'units': units}
+        else:
+            # User specified date(s)
+            calc_end = user_end or user_start
+
+            if single_date_mode:
+                # Special handling for single date mode
+                if last_date:
+                    calc_start = last_date + timedelta(days=1)
+                    if calc_start > calc_end:
+                        logger.info(f"Nothing to calculate for {thingid} (last calculated {last_date})")
+                        return {'thingid': thingid, 'status': 'skipped',
+                                'detail': f'already calculated up to {last_date}', 'units': units}
+                else:
+                    # No previous calculation - find earliest logs
+                    calc_start = get_earliest_log_date(
+                        cassandra_session,
+                        thingid,
+                        created_date=created_date,
+                        scan_end=calc_end
+                    )
+                    if not calc_start:
+                        logger.warning(f"No logs found for {thingid}")
+                        return {'thingid': thingid, 'status': 'skipped', 'detail': 'no logs found', 'units': units}
+                    calc_start = min(calc_start, calc_end)
+            else:
+                # Date range mode - always respect user's requested range
+                calc_start = user_start
+                # Check if we need to backfill from last calculated date
+                if last_date and last_date + timedelta(days=1) < user_start:
+                    backfill_start = last_date + timedelta(days=1)
+                    backfill_end = user_start - timedelta(days=1)
+                    if backfill_start <= backfill_end:
+                        logger.info(f"Backfilling gap for {thingid} from {backfill_start} to {backfill_end}")
+                        units.append((backfill_start, backfill_end, False))
+
+    if calc_start > calc_end:
+        logger.info(f"Nothing to calculate for {thingid} in given range.")
+        return {'thingid': thingid, 'status': 'skipped', 'detail': 'empty range', 'units': units}
+
+    units = merge_units(units + [(calc_start, calc_end, force_update)])
+    return {'thingid': thingid, 'status': 'planned', 'detail': f'{units[0][0]} to {calc_end}', 'units': units}
+
+def plan_asset_safely(asset, connections, **options):
+    """
+    Run plan_asset with failure isolation and timing
+    Args:
+        asset: Asset dict
+        connections: ConnectionManager to borrow the Cassandra session from
+        options: Keyword arguments forwarded to plan_asset
+    Returns:
+        dict: plan_asset result with 'elapsed' seconds; status is 'failed' with no units on any error
+    """
+    plan_start = time.time()
+    thingid = asset.get('identifier', '<unknown>')
+    try:
+        plan = plan_asset(asset, connections.cassandra_session, **options)
+    except Exception as e:
+        logger.error(f"Asset {thingid} failed: {str(e)}", exc_info=True)
+        plan = {'thingid': thingid, 'status': 'failed', 'detail': str(e), 'units': []}
+    plan['elapsed'] = time.time() - plan_start
+    return plan
+
+def build_work_plan(assets, connections, workers=1, **options):
+    """
+    Plan every asset, planning `workers` assets concurrently
+    Args:
+        assets: Asset dicts
+        connections: ConnectionManager to borrow the Cassandra session from
+        options: Keyword arguments forwarded to plan_asset
+    Returns:
+        list: plan_asset_safely results in asset order
+    """
+    if workers == 1:
+        return [plan_asset_safely(asset, connections, **options) for asset in assets]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asset-planner') as executor:
+        return list(executor.map(lambda asset: plan_asset_safely(asset, connections, **options), assets))
+
+def estimate_plan(plans):
+    """
+    Size a work plan: each unit reads one UTC partition more than it has UAE days and
+    writes at most one run_hours row per day (days already stored are skipped unless forced)
+    Returns:
+        dict: Asset counts by status and the units, days, partitions and rows of the whole plan
+    """
+    totals = {'assets': len(plans), 'planned': 0, 'skipped': 0, 'failed': 0,
+              'units': 0, 'days': 0, 'partitions': 0, 'rows': 0}
+    for plan in plans:
+        totals[plan['status']] += 1
+        for start_date, end_date, _ in plan['units']:
+            days = (end_date - start_date).days + 1
+            totals['units'] += 1
+            totals['days'] += days
+            totals['partitions'] += len(partitions_for_uae_range(start_date, end_date))
+            totals['rows'] += days
+    return totals
+
+def log_plan(plans):
+    """Log every asset's ranges and the estimated size of the whole plan"""
+    for plan in plans:
+        if plan['units']:
+            ranges = ", ".join(
+                f"{start_date} to {end_date}{' (force)' if force_update else ''}"
+                for start_date, end_date, force_update in plan['units']
+            )
+        else:
+            ranges = plan['detail']
+        log = logger.error if plan['status'] == 'failed' else logger.info
+        log(f"  {plan['thingid']}: {plan['status']} - {ranges}")
+
+    totals = estimate_plan(plans)
+    logger.info(
+        f"Work plan: {totals['assets']} assets - {totals['planned']} planned, {totals['skipped']} skipped, "
+        f"{totals['failed']} failed; {totals['units']} ranges covering {totals['days']} days, "
+        f"~{totals['partitions']} partitions to read, up to {totals['rows']} rows to write"
+    )
+    return totals
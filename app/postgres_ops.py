@@ -1,8 +1,10 @@
 
 import psycopg2
+import json
 import logging
 from psycopg2.extras import execute_batch
 from config.settings import settings
+from app.metrics import POSTGRES_OPERATION_SECONDS, POSTGRES_ROWS_WRITTEN, instrument
 from datetime import datetime, time, timedelta
 from pytz import timezone
 logger = logging.getLogger(__name__)
@@ -19,6 +21,12 @@ def to_uae_midnight(date_input):
             date_input = date_input.date()
     return uae_tz.localize(datetime.combine(date_input, time.min))
 
+def apply_session_settings(conn):
+    """Apply per-connection session settings once; committed so a later rollback keeps them"""
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'Asia/Dubai';")
+    conn.commit()
+
 def connect_postgres():
     try:
         conn = psycopg2.connect(
@@ -27,13 +35,74 @@ def connect_postgres():
             user=settings.POSTGRES_USER,
             password=settings.POSTGRES_PASSWORD
         )
-        with conn.cursor() as cur:
-            cur.execute("SET TIME ZONE 'Asia/Dubai';")
+        apply_session_settings(conn)
         return conn
     except Exception as e:
         logger.error(f"❌ Error connecting to PostgreSQL: {e}")
         raise
 
+# Tables owned by this job besides run_hours; created on startup by ensure_support_tables
+SUPPORT_TABLES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS run_hour_state (
+        thingid text PRIMARY KEY,
+        last_state text NOT NULL,
+        open_on_start timestamptz,
+        valid_through date NOT NULL,
+        range_start date,
+        range_open_on_start timestamptz,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+    # Columns added after run_hour_state was first deployed
+    "ALTER TABLE run_hour_state ADD COLUMN IF NOT EXISTS range_start date",
+    "ALTER TABLE run_hour_state ADD COLUMN IF NOT EXISTS range_open_on_start timestamptz",
+    """
+    CREATE TABLE IF NOT EXISTS run_hours_live (
+        thingid text NOT NULL,
+        datadate timestamptz NOT NULL,
+        on_hours bigint NOT NULL,
+        off_hours bigint NOT NULL,
+        last_datatime timestamptz,
+        updated_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (thingid, datadate)
+    )
+    """,
+]
+
+# Rollup table -> period; each row holds the run_hours totals of one asset over one UAE
+# week (starting Monday) or calendar month, maintained by write_run_hours
+ROLLUP_TABLES = {
+    "run_hours_weekly": "week",
+    "run_hours_monthly": "month",
+}
+
+for _table in ROLLUP_TABLES:
+    SUPPORT_TABLES_DDL.append(f"""
+    CREATE TABLE IF NOT EXISTS {_table} (
+        thingid text NOT NULL,
+        period_start date NOT NULL,
+        on_hours bigint NOT NULL DEFAULT 0,
+        off_hours bigint NOT NULL DEFAULT 0,
+        days integer NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (thingid, period_start)
+    )
+    """)
+    # Fleet reports read one period across all assets
+    SUPPORT_TABLES_DDL.append(f"CREATE INDEX IF NOT EXISTS {_table}_period_idx ON {_table} (period_start)")
+
+def ensure_support_tables(conn):
+    try:
+        with conn.cursor() as cur:
+            for ddl in SUPPORT_TABLES_DDL:
+                cur.execute(ddl)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Error creating support tables: {e}")
+        raise
+
 def get_last_calculated_date(conn, thingid):
     try:
         with conn.cursor() as cur:
@@ -50,6 +119,132 @@ def get_last_calculated_date(conn, thingid):
         logger.error(f"Error fetching last calculated date for {thingid}: {e}")
         return None
 
+@instrument(POSTGRES_OPERATION_SECONDS, operation="get_last_calculated_dates")
+def get_last_calculated_dates(conn, thingids):
+    """
+    Fleet-wide variant of get_last_calculated_date.
+
+    Runs a single query that does one backward index probe on (thingid, datadate)
+    per asset instead of one MAX() round trip per asset.
+
+    Returns:
+        dict: {thingid: last datadate in UAE time}; assets without rows are omitted
+    Raises any query error: an empty result would make every asset look new and
+    recalculate it from its earliest log
+    """
+    thingids = list(dict.fromkeys(thingids))
+    if not thingids:
+        return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT t.thingid, last_row.datadate
+                FROM unnest(%s::text[]) AS t(thingid)
+                CROSS JOIN LATERAL (
+                    SELECT datadate
+                    FROM run_hours
+                    WHERE run_hours.thingid = t.thingid
+                    ORDER BY datadate DESC
+                    LIMIT 1
+                ) AS last_row
+            """, (thingids,))
+            return {thingid: datadate.astimezone(uae_tz) for thingid, datadate in cur}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error fetching last calculated dates for {len(thingids)} assets: {e}")
+        raise
+
+def get_run_hour_state(conn, thingid):
+    """
+    Trailing calculation state persisted by the previous run of thingid, with the
+    first day of that run's range and the ON interval it started with
+    Returns:
+        dict: {'last_state', 'open_on_start', 'valid_through', 'range_start', 'range_open_on_start'}
+              or None
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT last_state, open_on_start, valid_through, range_start, range_open_on_start
+                FROM run_hour_state
+                WHERE thingid = %s
+            """, (thingid,))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return {
+            'last_state': row[0],
+            'open_on_start': row[1].astimezone(uae_tz) if row[1] else None,
+            'valid_through': row[2],
+            'range_start': row[3],
+            'range_open_on_start': row[4].astimezone(uae_tz) if row[4] else None
+        }
+    except Exception as e:
+        # Clear the aborted transaction so the caller can continue without the state
+        conn.rollback()
+        logger.error(f"Error fetching run hour state for {thingid}: {e}")
+        return None
+
+def upsert_run_hour_state(cur, thingid, state):
+    """Store the trailing state of thingid within the caller's transaction"""
+    cur.execute("""
+        INSERT INTO run_hour_state (thingid, last_state, open_on_start, valid_through,
+                                    range_start, range_open_on_start, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, now())
+        ON CONFLICT (thingid) DO UPDATE
+        SET last_state = EXCLUDED.last_state,
+            open_on_start = EXCLUDED.open_on_start,
+            valid_through = EXCLUDED.valid_through,
+            range_start = EXCLUDED.range_start,
+            range_open_on_start = EXCLUDED.range_open_on_start,
+            updated_at = EXCLUDED.updated_at
+    """, (thingid, state['last_state'], state['open_on_start'], state['valid_through'],
+          state.get('range_start'), state.get('range_open_on_start')))
+
+def save_run_hour_state(conn, thingid, state):
+    try:
+        with conn.cursor() as cur:
+            upsert_run_hour_state(cur, thingid, state)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error saving run hour state for {thingid}: {e}")
+        raise
+
+@instrument(POSTGRES_OPERATION_SECONDS, operation="upsert_live_run_hours")
+def upsert_live_run_hours(conn, record, prune_before=None):
+    """
+    Replace the partial run hours of the current UAE day in run_hours_live
+
+    Args:
+        conn: PostgreSQL connection
+        record: {'thingid', 'datadate', 'on_hours', 'off_hours', 'last_datatime'}
+        prune_before: Optional datadate; live rows of thingid before it are deleted
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO run_hours_live (thingid, datadate, on_hours, off_hours, last_datatime, updated_at)
+                VALUES (%s, %s, %s, %s, %s, now())
+                ON CONFLICT (thingid, datadate) DO UPDATE
+                SET on_hours = EXCLUDED.on_hours,
+                    off_hours = EXCLUDED.off_hours,
+                    last_datatime = EXCLUDED.last_datatime,
+                    updated_at = EXCLUDED.updated_at
+            """, (record['thingid'], record['datadate'], record['on_hours'], record['off_hours'],
+                  record['last_datatime']))
+            if prune_before is not None:
+                cur.execute(
+                    "DELETE FROM run_hours_live WHERE thingid = %s AND datadate < %s",
+                    (record['thingid'], prune_before)
+                )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error updating live run hours for {record['thingid']}: {e}")
+        raise
+
+@instrument(POSTGRES_OPERATION_SECONDS, operation="run_hour_exists")
 def run_hour_exists(conn, thingid, datadate):
     try:
         if datadate.tzinfo is None:
@@ -65,6 +260,280 @@ def run_hour_exists(conn, thingid, datadate):
         logger.error(f"Error checking existence: {e}")
         return False
 
+@instrument(POSTGRES_OPERATION_SECONDS, operation="get_existing_run_hour_dates")
+def get_existing_run_hour_dates_bulk(conn, thingids, start_date, end_date):
+    """
+    Return the UAE dates already stored in run_hours for several assets in one query.
+
+    The datadate column is compared against plain UAE-midnight bounds, so the
+    (thingid, datadate) index can serve the range scan.
+
+    Returns:
+        dict: {thingid: set(date)} with an entry for every requested thingid
+    Raises any query error: empty sets would make stored days look missing
+    """
+    existing = {thingid: set() for thingid in thingids}
+    if not existing:
+        return existing
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT thingid, datadate
+                FROM run_hours
+                WHERE thingid = ANY(%s)
+                AND datadate >= %s
+                AND datadate < %s
+            """, (
+                list(existing),
+                to_uae_midnight(start_date),
+                to_uae_midnight(end_date + timedelta(days=1))
+            ))
+            for thingid, datadate in cur:
+                existing[thingid].add(datadate.astimezone(uae_tz).date())
+        return existing
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error fetching existing run hour dates: {e}")
+        raise
+
+def get_existing_run_hour_dates(conn, thingid, start_date, end_date):
+    """Return the set of UAE dates already stored in run_hours for thingid between start_date and end_date"""
+    return get_existing_run_hour_dates_bulk(conn, [thingid], start_date, end_date)[thingid]
+
+@instrument(POSTGRES_OPERATION_SECONDS, operation="get_run_hours")
+def get_run_hours(conn, thingids, start_date, end_date):
+    """
+    Daily run hours of several assets between two UAE dates, in one index range scan per asset
+    Returns:
+        dict: {thingid: [(date, on_hours, off_hours)]} in date order with an entry for every
+              requested thingid, or None on error
+    """
+    rows = {thingid: [] for thingid in thingids}
+    if not rows:
+        return rows
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT thingid, datadate, on_hours, off_hours
+                FROM run_hours
+                WHERE thingid = ANY(%s)
+                AND datadate >= %s
+                AND datadate < %s
+                ORDER BY thingid, datadate
+            """, (
+                list(rows),
+                to_uae_midnight(start_date),
+                to_uae_midnight(end_date + timedelta(days=1))
+            ))
+            for thingid, datadate, on_hours, off_hours in cur:
+                rows[thingid].append((datadate.astimezone(uae_tz).date(), on_hours, off_hours))
+        return rows
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error fetching run hours for {len(rows)} assets: {e}")
+        return None
+
+UPSERT_RUN_HOURS_SQL = """
+    INSERT INTO run_hours (thingid, datadate, on_hours, off_hours)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (thingid, datadate) DO UPDATE
+    SET on_hours = EXCLUDED.on_hours,
+        off_hours = EXCLUDED.off_hours
+"""
+
+def period_start(day, period):
+    """First UAE day of the week (Monday) or month containing day"""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def add_rollup_deltas(deltas, rows, sign=1):
+    """
+    Accumulate run_hours rows into rollup deltas
+    Args:
+        deltas: {(table, thingid, period_start): [on_hours, off_hours, days]}, updated in place
+        rows: (thingid, datadate, on_hours, off_hours) tuples
+        sign: 1 for rows written, -1 for rows replaced or deleted
+    """
+    for thingid, datadate, on_hours, off_hours in rows:
+        day = datadate.astimezone(uae_tz).date() if datadate.tzinfo else datadate.date()
+        for table, period in ROLLUP_TABLES.items():
+            delta = deltas.setdefault((table, thingid, period_start(day, period)), [0, 0, 0])
+            delta[0] += sign * on_hours
+            delta[1] += sign * off_hours
+            delta[2] += sign
+
+def apply_rollup_deltas(cur, deltas):
+    """Add accumulated deltas to the rollup tables inside the caller's transaction"""
+    for table in ROLLUP_TABLES:
+        params = [
+            (thingid, start, on_hours, off_hours, days)
+            for (delta_table, thingid, start), (on_hours, off_hours, days) in sorted(deltas.items())
+            if delta_table == table and (on_hours or off_hours or days)
+        ]
+        if params:
+            execute_batch(cur, f"""
+                INSERT INTO {table} (thingid, period_start, on_hours, off_hours, days, updated_at)
+                VALUES (%s, %s, %s, %s, %s, now())
+                ON CONFLICT (thingid, period_start) DO UPDATE
+                SET on_hours = {table}.on_hours + EXCLUDED.on_hours,
+                    off_hours = {table}.off_hours + EXCLUDED.off_hours,
+                    days = {table}.days + EXCLUDED.days,
+                    updated_at = EXCLUDED.updated_at
+            """, params)
+
+def subtract_deleted_run_hours(cur):
+    """Remove the rows returned by a DELETE ... RETURNING thingid, datadate, on_hours, off_hours from the rollups"""
+    deltas = {}
+    add_rollup_deltas(deltas, cur.fetchall(), sign=-1)
+    apply_rollup_deltas(cur, deltas)
+
+def lock_run_hours_assets(cur, thingids):
+    """
+    Serialize the run_hours writers of each asset until the transaction ends
+
+    FOR UPDATE cannot lock a day that has no row yet, so two transactions inserting
+    the same new day would both add it to the rollups. With a transaction-level
+    advisory lock per thingid the second writer waits and then reads the first
+    one's row as existing. Locks are taken in thingid order to avoid deadlocks and
+    may be taken again by the same transaction.
+    """
+    for thingid in sorted(set(thingids)):
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (thingid,))
+
+def _lock_existing_run_hours(cur, records):
+    """Current (thingid, datadate, on_hours, off_hours) of the records' keys, locked until commit"""
+    cur.execute("""
+        SELECT run_hours.thingid, run_hours.datadate, run_hours.on_hours, run_hours.off_hours
+        FROM run_hours
+        JOIN unnest(%s::text[], %s::timestamptz[]) AS k(thingid, datadate)
+        ON run_hours.thingid = k.thingid AND run_hours.datadate = k.datadate
+        FOR UPDATE OF run_hours
+    """, ([r["thingid"] for r in records], [r["datadate"] for r in records]))
+    return cur.fetchall()
+
+def notify_run_hours_changed(cur, keys=None):
+    """
+    NOTIFY settings.RUN_HOURS_NOTIFY_CHANNEL of the days written per asset; delivered on commit
+    Args:
+        cur: Cursor of the writing transaction
+        keys: (thingid, UAE date) pairs written, where a None date stands for every day of the
+              asset; None announces a change to every asset
+    """
+    channel = settings.RUN_HOURS_NOTIFY_CHANNEL
+    if not channel:
+        return
+    if keys is None:
+        payloads = [json.dumps({"thingid": None})]
+    else:
+        # One message per asset with the range written keeps payloads far below the 8000 byte limit
+        ranges = {}
+        for thingid, day in keys:
+            if day is None or ranges.get(thingid, ()) is None:
+                ranges[thingid] = None
+            else:
+                first, last = ranges.get(thingid, (day, day))
+                ranges[thingid] = (min(first, day), max(last, day))
+        payloads = [
+            json.dumps({"thingid": thingid} if days is None else
+                       {"thingid": thingid, "start": days[0].isoformat(), "end": days[1].isoformat()})
+            for thingid, days in ranges.items()
+        ]
+    cur.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (channel, payloads))
+
+class _LineStream:
+    """Minimal file-like object that feeds COPY FROM STDIN from an iterator of text lines"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+def _copy_text(value):
+    """Escape a value for the COPY text format"""
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def bulk_upsert_run_hours(cur, records):
+    """
+    Stream records into a temporary staging table with COPY FROM STDIN and merge
+    them into run_hours with a single set-based upsert.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS run_hours_stage (
+            thingid text,
+            datadate timestamptz,
+            on_hours bigint,
+            off_hours bigint
+        ) ON COMMIT DELETE ROWS
+    """)
+    cur.execute("TRUNCATE run_hours_stage")
+    cur.copy_expert(
+        "COPY run_hours_stage (thingid, datadate, on_hours, off_hours) FROM STDIN",
+        _LineStream(
+            f"{_copy_text(r['thingid'])}\t{r['datadate'].isoformat()}\t{r['on_hours']}\t{r['off_hours']}\n"
+            for r in records
+        )
+    )
+    # DISTINCT ON keeps the last staged row per key so ON CONFLICT never hits a row twice
+    cur.execute("""
+        INSERT INTO run_hours (thingid, datadate, on_hours, off_hours)
+        SELECT DISTINCT ON (thingid, datadate) thingid, datadate, on_hours, off_hours
+        FROM run_hours_stage
+        ORDER BY thingid, datadate, ctid DESC
+        ON CONFLICT (thingid, datadate) DO UPDATE
+        SET on_hours = EXCLUDED.on_hours,
+            off_hours = EXCLUDED.off_hours
+    """)
+    return cur.rowcount
+
+@instrument(POSTGRES_OPERATION_SECONDS, operation="write_run_hours")
+def write_run_hours(cur, records, copy_threshold=None):
+    """
+    Upsert run hour records inside the caller's transaction.
+
+    Small batches use execute_batch; from copy_threshold rows on
+    (default: settings.RUN_HOURS_COPY_THRESHOLD) the COPY staging path is used.
+    The weekly and monthly rollups are updated in the same transaction.
+    """
+    if copy_threshold is None:
+        copy_threshold = settings.RUN_HOURS_COPY_THRESHOLD
+    POSTGRES_ROWS_WRITTEN.inc(len(records))
+
+    # The rollups move by the difference between the rows replaced and the rows written;
+    # of several records for one key only the last one is stored
+    final_records = {}
+    for r in records:
+        final_records[(r["thingid"], r["datadate"].astimezone(uae_tz).date())] = r
+    deltas = {}
+    lock_run_hours_assets(cur, (thingid for thingid, _ in final_records))
+    # Each stored row is replaced once, however many records the batch has for its key
+    add_rollup_deltas(deltas, _lock_existing_run_hours(cur, list(final_records.values())), sign=-1)
+    add_rollup_deltas(deltas, (
+        (r["thingid"], r["datadate"], r["on_hours"], r["off_hours"]) for r in final_records.values()
+    ))
+
+    if len(records) >= copy_threshold:
+        logger.debug(f"Using COPY for {len(records)} run hour records")
+        bulk_upsert_run_hours(cur, records)
+    else:
+        execute_batch(cur, UPSERT_RUN_HOURS_SQL, [
+            (r["thingid"], r["datadate"], r["on_hours"], r["off_hours"])
+            for r in records
+        ])
+    apply_rollup_deltas(cur, deltas)
+    notify_run_hours_changed(cur, final_records)
+
+@instrument(POSTGRES_OPERATION_SECONDS, operation="insert_or_update_run_hours_batch")
 def insert_or_update_run_hours_batch(conn, records, force_update=False):
     try:
         if not records:
@@ -75,10 +544,10 @@ def insert_or_update_run_hours_batch(conn, records, force_update=False):
         date_values = [r["datadate"].date() for r in records]
 
         with conn.cursor() as cur:
-            # Ensure we're in UAE timezone
-            cur.execute("SET TIME ZONE 'Asia/Dubai';")
-
+            # Connections are in UAE time via apply_session_settings
             if force_update:
+                # Lock before the DELETE so it cannot interleave with another writer of the asset
+                lock_run_hours_assets(cur, [thingid])
                 # Delete by date range to catch all timezone variants
                 min_date = min(date_values)
                 max_date = max(date_values)
@@ -86,22 +555,15 @@ def insert_or_update_run_hours_batch(conn, records, force_update=False):
                     """DELETE FROM run_hours 
                     WHERE thingid = %s 
                     AND datadate >= %s 
-                    AND datadate < %s + interval '1 day'""",
+                    AND datadate < %s + interval '1 day'
+                    RETURNING thingid, datadate, on_hours, off_hours""",
                     (thingid, min_date, max_date)
                 )
                 logger.info(f"🗑️ Deleted {cur.rowcount} existing records for force update")
+                subtract_deleted_run_hours(cur)
 
             # Insert new records with explicit timezone
-            execute_batch(cur, """
-                INSERT INTO run_hours (thingid, datadate, on_hours, off_hours)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (thingid, datadate) DO UPDATE
-                SET on_hours = EXCLUDED.on_hours,
-                    off_hours = EXCLUDED.off_hours
-            """, [
-                (r["thingid"], r["datadate"], r["on_hours"], r["off_hours"])
-                for r in records
-            ])
+            write_run_hours(cur, records)
 
         conn.commit()
         count = len(records)
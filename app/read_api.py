@@ -0,0 +1,379 @@
+"""
+Cached read API for run hours.
+
+Serves per-asset daily run hours, range totals, fleet totals from the rollups and
+a bulk multi-asset query from an in-process LRU cache with a TTL. Entries are
+dropped as soon as the calculator writes one of their (thingid, day) rows:
+write_run_hours sends a NOTIFY on RUN_HOURS_NOTIFY_CHANNEL with its commit and a
+listener thread invalidates the affected entries.
+
+Usage:
+    python -m app.read_api
+"""
+import json
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import psycopg2
+from flask import Flask, jsonify, request
+from app.connections import ConnectionManager
+from app.logger import configure_logging
+from app.metrics import Counter, render_metrics
+from app.postgres_ops import connect_postgres, get_run_hours, period_start
+from app.rollups import get_fleet_rollup
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+READ_API_CACHE_REQUESTS = Counter(
+    "run_hours_read_api_cache_requests_total", "Read API cache lookups by result", ["result"]
+)
+
+# Tag of cache entries that cover every asset, e.g. fleet totals
+FLEET = None
+
+
+class RunHoursCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Each entry is tagged with the (thingid, first day, last day) it was built from;
+    invalidate() drops the entries of an asset, or fleet-wide entries, whose days
+    overlap a written range. A load that started before an invalidation of its own
+    asset (or, for fleet-wide entries, of any asset) is not stored, so a read racing
+    a write never caches the old rows; writes to other assets do not discard it.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or settings.READ_API_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.READ_API_CACHE_TTL
+        self._entries = OrderedDict()
+        self._keys_by_thingid = {}
+        # Bumped by clear(); the per-asset counters restart from it
+        self._epoch = 0
+        # Invalidations per asset, and of any asset for fleet-wide entries
+        self._asset_generations = {}
+        self._fleet_generation = 0
+        self._lock = threading.Lock()
+
+    def _generation(self, thingid):
+        if thingid is FLEET:
+            return self._epoch, self._fleet_generation
+        return self._epoch, self._asset_generations.get(thingid, 0)
+
+    def generation(self, thingid=FLEET):
+        """
+        Token to pass to put() for an entry tagged with thingid (FLEET for fleet-wide
+        entries); the put is ignored if the entry's asset is invalidated in between
+        """
+        with self._lock:
+            return self._generation(thingid)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                READ_API_CACHE_REQUESTS.inc(result="miss")
+                return None
+            value, tag, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                READ_API_CACHE_REQUESTS.inc(result="expired")
+                return None
+            self._entries.move_to_end(key)
+            READ_API_CACHE_REQUESTS.inc(result="hit")
+            return value
+
+    def put(self, key, value, tag, generation):
+        """
+        Store value under key
+        Args:
+            tag: (thingid or FLEET, first day, last day) covered by the value
+            generation: generation(tag[0]) taken before the value was loaded
+        """
+        with self._lock:
+            if generation != self._generation(tag[0]):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, tag, time.monotonic() + self.ttl)
+            self._keys_by_thingid.setdefault(tag[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, thingid=FLEET, start=None, end=None):
+        """
+        Drop the entries of thingid overlapping start..end, and fleet-wide entries overlapping it
+        Args:
+            thingid: Asset written; FLEET drops every entry
+            start, end: Days written; None drops every entry of thingid
+        """
+        with self._lock:
+            if thingid is FLEET:
+                self._epoch += 1
+                self._asset_generations.clear()
+                self._fleet_generation = 0
+                self._entries.clear()
+                self._keys_by_thingid.clear()
+                return
+            self._asset_generations[thingid] = self._asset_generations.get(thingid, 0) + 1
+            self._fleet_generation += 1
+            for tag_thingid in (thingid, FLEET):
+                for key in list(self._keys_by_thingid.get(tag_thingid, ())):
+                    _, (_, first, last), _ = self._entries[key]
+                    if start is None or (first <= end and start <= last):
+                        self._remove(key)
+
+    def clear(self):
+        self.invalidate(FLEET)
+
+    def _remove(self, key):
+        _, tag, _ = self._entries.pop(key)
+        keys = self._keys_by_thingid[tag[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_thingid[tag[0]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def apply_notification(cache, payload):
+    """Invalidate the cache entries named by one run_hours NOTIFY payload"""
+    try:
+        message = json.loads(payload)
+        thingid = message.get("thingid")
+        if thingid is None:
+            cache.clear()
+        elif "start" in message:
+            cache.invalidate(thingid, date.fromisoformat(message["start"]), date.fromisoformat(message["end"]))
+        else:
+            cache.invalidate(thingid)
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        # Unknown payloads must not leave stale entries behind
+        logger.warning(f"Clearing the cache after an unreadable notification {payload!r}: {e}")
+        cache.clear()
+
+
+class InvalidationListener(threading.Thread):
+    """
+    LISTENs on RUN_HOURS_NOTIFY_CHANNEL over its own autocommit connection and applies
+    each notification to the cache. Notifications sent while disconnected are lost, so
+    the cache is cleared whenever the connection is (re)established.
+    """
+
+    def __init__(self, cache, channel=None, poll_timeout=5.0, retry_delay=5.0):
+        super().__init__(name="run-hours-listener", daemon=True)
+        self.cache = cache
+        self.channel = channel or settings.RUN_HOURS_NOTIFY_CHANNEL
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = connect_postgres()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                self.cache.clear()
+                logger.info(f"Listening for run_hours changes on {self.channel}")
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        apply_notification(self.cache, conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError) as e:
+                logger.error(f"Run hours listener disconnected: {e}; retrying in {self.retry_delay}s")
+                self.cache.clear()
+                self._stop_event.wait(self.retry_delay)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+
+class BadRequest(Exception):
+    """Invalid request parameters; answered with 400"""
+
+
+def parse_day(value, name):
+    if not value:
+        raise BadRequest(f"'{name}' is required (YYYY-MM-DD)")
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise BadRequest(f"Invalid {name}: {value}. Use YYYY-MM-DD.")
+
+
+def parse_range(params):
+    start = parse_day(params.get("start"), "start")
+    end = parse_day(params.get("end") or params.get("start"), "end")
+    if end < start:
+        raise BadRequest("'end' is before 'start'")
+    if (end - start).days + 1 > settings.READ_API_MAX_DAYS:
+        raise BadRequest(f"Ranges are limited to {settings.READ_API_MAX_DAYS} days")
+    return start, end
+
+
+def serialize_days(rows):
+    return [{"date": day.isoformat(), "on_hours": on_hours, "off_hours": off_hours}
+            for day, on_hours, off_hours in rows]
+
+
+def create_app(connections=None, cache=None):
+    """
+    Build the read API
+    Args:
+        connections: ConnectionManager for PostgreSQL reads (default: a new one)
+        cache: RunHoursCache (default: a new one sized from the settings)
+    """
+    connections = connections or ConnectionManager()
+    cache = cache if cache is not None else RunHoursCache()
+    app = Flask(__name__)
+    app.config["RUN_HOURS_CACHE"] = cache
+
+    def load_assets(thingids, start, end):
+        """
+        Daily rows of several assets: cached assets are served from the cache, the rest
+        with one query whose per-asset results are cached separately
+        Returns:
+            dict: {thingid: serialized days}, or None if PostgreSQL could not be read
+        """
+        results = {}
+        missing = []
+        for thingid in thingids:
+            days = cache.get(("days", thingid, start, end))
+            if days is None:
+                missing.append(thingid)
+            else:
+                results[thingid] = days
+        if missing:
+            generations = {thingid: cache.generation(thingid) for thingid in missing}
+            with connections.postgres() as pg_conn:
+                rows = get_run_hours(pg_conn, missing, start, end)
+            if rows is None:
+                return None
+            for thingid, asset_rows in rows.items():
+                days = serialize_days(asset_rows)
+                cache.put(("days", thingid, start, end), days, (thingid, start, end), generations[thingid])
+                results[thingid] = days
+        return results
+
+    def totals(days):
+        return {
+            "on_hours": sum(day["on_hours"] for day in days),
+            "off_hours": sum(day["off_hours"] for day in days),
+            "days": len(days)
+        }
+
+    @app.before_request
+    def authenticate():
+        if settings.READ_API_TOKEN and request.endpoint not in ("health", "metrics"):
+            if request.headers.get("Authorization") != f"Bearer {settings.READ_API_TOKEN}":
+                return jsonify({"error": "Unauthorized"}), 401
+        return None
+
+    @app.errorhandler(BadRequest)
+    def bad_request(error):
+        return jsonify({"error": str(error)}), 400
+
+    @app.route("/health")
+    def health():
+        return jsonify({"status": "ok", "cache_entries": len(cache)})
+
+    @app.route("/metrics")
+    def metrics():
+        return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+    @app.route("/run-hours/<thingid>")
+    def asset_run_hours(thingid):
+        start, end = parse_range(request.args)
+        results = load_assets([thingid], start, end)
+        if results is None:
+            return jsonify({"error": "Run hours unavailable"}), 503
+        return jsonify({"thingid": thingid, "start": start.isoformat(), "end": end.isoformat(),
+                        "days": results[thingid]})
+
+    @app.route("/run-hours/<thingid>/total")
+    def asset_total(thingid):
+        start, end = parse_range(request.args)
+        results = load_assets([thingid], start, end)
+        if results is None:
+            return jsonify({"error": "Run hours unavailable"}), 503
+        return jsonify(dict(totals(results[thingid]), thingid=thingid, start=start.isoformat(),
+                            end=end.isoformat()))
+
+    @app.route("/run-hours/bulk", methods=["POST"])
+    def bulk_run_hours():
+        body = request.get_json(silent=True) or {}
+        thingids = body.get("thingids")
+        if not isinstance(thingids, list) or not thingids or not all(isinstance(t, str) for t in thingids):
+            raise BadRequest("'thingids' must be a non-empty list of asset identifiers")
+        if len(thingids) > settings.READ_API_MAX_BULK_ASSETS:
+            raise BadRequest(f"At most {settings.READ_API_MAX_BULK_ASSETS} assets per request")
+        start, end = parse_range(body)
+        results = load_assets(list(dict.fromkeys(thingids)), start, end)
+        if results is None:
+            return jsonify({"error": "Run hours unavailable"}), 503
+        if body.get("totals"):
+            results = {thingid: totals(days) for thingid, days in results.items()}
+        return jsonify({"start": start.isoformat(), "end": end.isoformat(), "assets": results})
+
+    @app.route("/fleet/run-hours")
+    def fleet_run_hours():
+        period = request.args.get("period", "month")
+        if period not in ("week", "month"):
+            raise BadRequest("'period' must be 'week' or 'month'")
+        first = period_start(parse_day(request.args.get("date"), "date"), period)
+        if period == "week":
+            last = first + timedelta(days=6)
+        else:
+            last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+        key = ("fleet", period, first)
+        result = cache.get(key)
+        if result is None:
+            generation = cache.generation(FLEET)
+            with connections.postgres() as pg_conn:
+                rollup = get_fleet_rollup(pg_conn, period, first)
+            if rollup is None:
+                return jsonify({"error": "Run hours unavailable"}), 503
+            result = {
+                "period": period,
+                "period_start": first.isoformat(),
+                "period_end": last.isoformat(),
+                "assets": len(rollup),
+                "on_hours": sum(row["on_hours"] for row in rollup.values()),
+                "off_hours": sum(row["off_hours"] for row in rollup.values()),
+                "by_asset": rollup
+            }
+            cache.put(key, result, (FLEET, first, last), generation)
+        if request.args.get("by_asset") not in ("1", "true"):
+            result = {name: value for name, value in result.items() if name != "by_asset"}
+        return jsonify(result)
+
+    return app
+
+
+def main():
+    configure_logging(settings.LOG_MODE, settings.LOG_JSON, settings.LOG_LEVEL.upper())
+    cache = RunHoursCache()
+    if settings.RUN_HOURS_NOTIFY_CHANNEL:
+        InvalidationListener(cache).start()
+    else:
+        logger.warning("RUN_HOURS_NOTIFY_CHANNEL is empty; cache entries are only dropped by their TTL")
+    app = create_app(cache=cache)
+    app.run(host="0.0.0.0", port=settings.READ_API_PORT, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from app.cassandra_ops import iter_event_buffers, partitions_for_uae_range, read_partition_async
+from app.metrics import ASSET_SECONDS
+from app.run_hour_calculation import begin_calculation, complete_calculation
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _CalculationUnit:
+    """One (thingid, range) calculation fed by the scheduler in partition order"""
+
+    def __init__(self, asset_result, start_date, end_date, force_update):
+        self.asset_result = asset_result
+        self.thingid = asset_result['thingid']
+        self.start_date = start_date
+        self.end_date = end_date
+        self.force_update = force_update
+        self.partitions = partitions_for_uae_range(start_date, end_date)
+        self.successor = None
+        self.calculator = None
+        self.persisted_state = None
+        self.next_submit = 0
+        self.next_index = 0
+        self.completed_reads = {}
+        self.failed = False
+        self.started = None
+
+
+class ReadScheduler:
+    """
+    Fleet-wide partition reads with a fixed number of async reads in flight.
+
+    The whole work plan - every UTC partition of every (thingid, range) unit - is
+    read with up to `window` reads open at once, regardless of which asset they
+    belong to. A read completes once the driver has delivered its last page, and
+    a read that fails fails its unit. Reads complete in any order; each result is
+    parked until the partitions before it in the same unit have been fed, so every
+    RunHourCalculator still sees its partitions in day order. A finished unit is stored by a pool of
+    `workers` threads, each borrowing a PostgreSQL connection, while the reads of
+    other units continue.
+
+    The units of one asset run one after the other: a unit starts from the trailing
+    state its predecessor stored, so it is only started once that unit is written.
+
+    Args:
+        connections: ConnectionManager providing the Cassandra session and PostgreSQL pool
+        window: Reads in flight (default: settings.READ_SCHEDULER_WINDOW)
+        workers: Threads storing finished units
+        engine: Run hour engine
+        journal: Optional RunJournal; completed units and assets are recorded in it
+    """
+
+    def __init__(self, connections, window=None, workers=1, engine=None, journal=None):
+        self.connections = connections
+        self.window = max(1, window or settings.READ_SCHEDULER_WINDOW)
+        self.workers = max(1, workers)
+        self.engine = engine
+        self.journal = journal
+        # Read completions (from driver callbacks) and stored units (from the writers)
+        self._events = queue.Queue()
+        self._ready = deque()
+        self._current = None
+        self._in_flight = 0
+        self._parked = 0
+        self._results_lock = threading.Lock()
+
+    def run(self, plans):
+        """
+        Calculate every unit of the given plans
+        Args:
+            plans: plan_asset() results with the planning time in 'elapsed'; a plan with status
+                   'failed' has no units. Units the journal has as done are skipped.
+        Returns:
+            list: Per-asset result dicts as produced by run_plan_safely
+        """
+        asset_results = []
+        reads = 0
+        for plan in plans:
+            result = {'thingid': plan['thingid'], 'status': plan['status'], 'detail': plan['detail'],
+                      'elapsed': plan['elapsed'], 'unit_seconds': 0.0}
+            asset_results.append(result)
+            previous = None
+            for start_date, end_date, force_update in plan['units']:
+                if self.journal and self.journal.unit_done(plan['thingid'], start_date, end_date, force_update):
+                    logger.info(f"Skipping {plan['thingid']} from {start_date} to {end_date}: completed by an earlier run")
+                    continue
+                unit = _CalculationUnit(result, start_date, end_date, force_update)
+                reads += len(unit.partitions)
+                if previous:
+                    previous.successor = unit
+                else:
+                    self._ready.append(unit)
+                previous = unit
+
+        chains = len(self._ready)
+        logger.info(f"Scheduling {reads} partition reads for {len(asset_results)} assets "
+                    f"with {self.window} reads in flight")
+
+        with self.connections.postgres() as pg_conn, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='unit-writer') as writers:
+            chains -= self._fill(pg_conn)
+            while chains:
+                event = self._events.get()
+                if event[0] == 'stored':
+                    chains -= self._chain_step(event[1])
+                else:
+                    _, unit, index, rows, error = event
+                    self._in_flight -= 1
+                    if unit.failed:
+                        # Reads still in flight when their unit failed are dropped
+                        pass
+                    elif error is not None:
+                        # A missing partition (or the rest of one) must not be written as a short day
+                        self._parked -= len(unit.completed_reads)
+                        unit.completed_reads.clear()
+                        self._fail(unit, Exception(
+                            f"Error fetching logs for {unit.thingid} on {unit.partitions[index]}: {error}"
+                        ))
+                        self._unit_finished(unit)
+                        chains -= 1
+                    else:
+                        unit.completed_reads[index] = rows
+                        self._parked += 1
+                        chains -= self._feed(unit, writers)
+                chains -= self._fill(pg_conn)
+
+        for result in asset_results:
+            self._finish_asset(result)
+        return asset_results
+
+    def _fill(self, pg_conn):
+        """
+        Submit reads until the window is full
+        Returns:
+            int: Number of asset chains that ended because a unit failed to start
+        """
+        ended = 0
+        # Parked results count against the window so one slow read cannot let them pile up
+        while self._in_flight + self._parked < self.window:
+            unit = self._current
+            if unit is None or unit.failed or unit.next_submit == len(unit.partitions):
+                if not self._ready:
+                    return ended
+                unit = self._ready.popleft()
+                if not self._start(unit, pg_conn):
+                    ended += 1
+                    continue
+                self._current = unit
+            self._submit(unit, unit.next_submit, unit.partitions[unit.next_submit])
+            unit.next_submit += 1
+        return ended
+
+    def _start(self, unit, pg_conn):
+        unit.started = time.time()
+        try:
+            unit.calculator, unit.persisted_state = begin_calculation(
+                unit.thingid, pg_conn, unit.start_date, unit.end_date, self.engine
+            )
+        except Exception as e:
+            self._fail(unit, e)
+            self._unit_finished(unit)
+            return False
+        return True
+
+    def _submit(self, unit, index, day):
+        calculator = unit.calculator
+        future = read_partition_async(
+            self.connections.cassandra_session, unit.thingid, day,
+            window=(calculator.uae_start, calculator.uae_end), columnar=True
+        )
+        self._in_flight += 1
+        pages = []
+
+        def on_page(rows):
+            # Callbacks get one page at a time; the read completes with the last page
+            pages.extend(rows)
+            if future.has_more_pages:
+                future.start_fetching_next_page()
+            else:
+                self._events.put(('read', unit, index, pages, None))
+
+        future.add_callbacks(on_page, lambda error: self._events.put(('read', unit, index, None, error)))
+
+    def _feed(self, unit, writers):
+        """
+        Feed the unit's parked partitions that are next in day order, handing the unit
+        to the writers once every partition is in
+        Returns:
+            int: 1 if the asset chain ended because the unit failed, else 0
+        """
+        while unit.next_index in unit.completed_reads:
+            rows = unit.completed_reads.pop(unit.next_index)
+            self._parked -= 1
+            day = unit.partitions[unit.next_index]
+            unit.next_index += 1
+            try:
+                logs_in_partition = unit.calculator.add_events(iter_event_buffers(rows, unit.thingid, day))
+            except Exception as e:
+                self._parked -= len(unit.completed_reads)
+                unit.completed_reads.clear()
+                self._fail(unit, e)
+                self._unit_finished(unit)
+                return 1
+            logger.info(f"Fetched {logs_in_partition} logs for {unit.thingid} from partition {day}")
+
+        if unit.next_index == len(unit.partitions):
+            writers.submit(self._store, unit)
+        return 0
+
+    def _store(self, unit):
+        try:
+            logger.info(f"Calculating run hours for {unit.thingid} from {unit.start_date} to {unit.end_date}")
+            with self.connections.postgres() as pg_conn:
+                complete_calculation(unit.calculator, unit.persisted_state, pg_conn, unit.force_update)
+            if self.journal:
+                self.journal.record_unit(unit.thingid, unit.start_date, unit.end_date, unit.force_update)
+        except Exception as e:
+            self._fail(unit, e)
+        finally:
+            unit.calculator = None
+            self._unit_finished(unit)
+            self._events.put(('stored', unit))
+
+    def _chain_step(self, unit):
+        """Queue the stored unit's successor; returns 1 if the asset chain ended instead"""
+        if unit.failed or unit.successor is None:
+            return 1
+        self._ready.append(unit.successor)
+        return 0
+
+    def _fail(self, unit, error):
+        logger.error(f"Error processing {unit.thingid}: {str(error)}", exc_info=error)
+        unit.failed = True
+        with self._results_lock:
+            unit.asset_result['status'] = 'failed'
+            unit.asset_result['detail'] = str(error)
+
+    def _unit_finished(self, unit):
+        # Units of one asset overlap with other assets' reads, so an asset's elapsed time
+        # is its planning time plus the wall time of its own units
+        with self._results_lock:
+            unit.asset_result['unit_seconds'] += time.time() - unit.started
+
+    def _finish_asset(self, result):
+        if result['status'] == 'planned':
+            result['status'] = 'processed'
+        if self.journal and result['status'] != 'failed':
+            self.journal.record_asset(result['thingid'], result['status'])
+        result['elapsed'] += result.pop('unit_seconds')
+        ASSET_SECONDS.observe(result['elapsed'], status=result['status'])
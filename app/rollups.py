@@ -0,0 +1,134 @@
+"""
+Weekly and monthly run hour rollups.
+
+write_run_hours keeps run_hours_weekly and run_hours_monthly current as it writes
+run_hours; rebuild_rollups recomputes them from run_hours to repair drift, e.g.
+after rows were edited by hand.
+
+Usage:
+    python -m app.rollups --rebuild
+    python -m app.rollups --rebuild --thingid AC_00001 --thingid AC_00002
+    python -m app.rollups --month 2025-05
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+from app.logger import configure_logging
+from app.postgres_ops import (
+    ROLLUP_TABLES, connect_postgres, ensure_support_tables, notify_run_hours_changed, period_start
+)
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_rollups(conn, thingids=None):
+    """
+    Recompute the rollup tables from run_hours in one transaction
+    Args:
+        conn: PostgreSQL connection
+        thingids: Only rebuild these assets (default: the whole fleet)
+    Returns:
+        dict: {table: rows written}
+    """
+    asset_filter = "WHERE thingid = ANY(%s)" if thingids else ""
+    params = (list(thingids),) if thingids else ()
+    written = {}
+    try:
+        with conn.cursor() as cur:
+            for table, period in ROLLUP_TABLES.items():
+                # Lock the rollup first so write_run_hours deltas cannot interleave with the rebuild
+                cur.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+                cur.execute(f"DELETE FROM {table} {asset_filter}", params)
+                cur.execute(f"""
+                    INSERT INTO {table} (thingid, period_start, on_hours, off_hours, days, updated_at)
+                    SELECT thingid, date_trunc('{period}', datadate AT TIME ZONE 'Asia/Dubai')::date,
+                           SUM(on_hours), SUM(off_hours), COUNT(*), now()
+                    FROM run_hours
+                    {asset_filter}
+                    GROUP BY 1, 2
+                """, params)
+                written[table] = cur.rowcount
+            notify_run_hours_changed(cur, [(thingid, None) for thingid in thingids] if thingids else None)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Error rebuilding rollups: {e}")
+        raise
+    for table, rows in written.items():
+        logger.info(f"✅ Rebuilt {table}: {rows} rows")
+    return written
+
+
+def get_fleet_rollup(conn, period, day):
+    """
+    Run hours of every asset over the week or month containing day, read from the rollup
+    Args:
+        conn: PostgreSQL connection
+        period: 'week' or 'month'
+        day: Any UAE date inside the period
+    Returns:
+        dict: {thingid: {'on_hours', 'off_hours', 'days'}} in milliseconds, or None on error
+    """
+    table = next(name for name, table_period in ROLLUP_TABLES.items() if table_period == period)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT thingid, on_hours, off_hours, days
+                FROM {table}
+                WHERE period_start = %s
+            """, (period_start(day, period),))
+            return {
+                thingid: {'on_hours': on_hours, 'off_hours': off_hours, 'days': days}
+                for thingid, on_hours, off_hours, days in cur
+            }
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error fetching {period} rollup for {day}: {e}")
+        return None
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Maintain the weekly and monthly run hour rollups')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute the rollups from run_hours')
+    parser.add_argument('--thingid', action='append', default=None,
+                        help='Limit --rebuild to this asset (repeatable)')
+    parser.add_argument('--month', default=None, help='Log the fleet totals of this month (YYYY-MM)')
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    configure_logging(settings.LOG_MODE, settings.LOG_JSON, settings.LOG_LEVEL.upper())
+    if not args.rebuild and not args.month:
+        parser.error('nothing to do: pass --rebuild and/or --month')
+    try:
+        month = datetime.strptime(args.month, "%Y-%m").date() if args.month else None
+    except ValueError:
+        parser.error(f"Invalid month: {args.month}. Use YYYY-MM.")
+
+    conn = connect_postgres()
+    try:
+        ensure_support_tables(conn)
+        if args.rebuild:
+            rebuild_rollups(conn, args.thingid)
+        if month:
+            rollup = get_fleet_rollup(conn, 'month', month)
+            if rollup is None:
+                sys.exit(1)
+            on_hours = sum(row['on_hours'] for row in rollup.values())
+            off_hours = sum(row['off_hours'] for row in rollup.values())
+            logger.info(
+                f"{month:%Y-%m}: {len(rollup)} assets, ON {on_hours / 3600000:.1f}h, OFF {off_hours / 3600000:.1f}h"
+            )
+    except Exception as e:
+        logger.error(f"Rollup command failed: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,28 @@
 
 
 
-from datetime import datetime, timedelta, time, timezone
+from datetime import date, datetime, timedelta, time, timezone
 import logging
-from collections import defaultdict
-from app.cassandra_ops import fetch_logs_for_day
-from psycopg2.extras import execute_batch
-from app.postgres_ops import insert_or_update_run_hours_batch, run_hour_exists
+from collections import Counter, defaultdict
+from config.settings import settings
+from app.cassandra_ops import fetch_logs_for_range, partitions_for_uae_range
+from app.postgres_ops import (
+    insert_or_update_run_hours_batch, get_existing_run_hour_dates, write_run_hours,
+    get_run_hour_state, save_run_hour_state, upsert_run_hour_state, subtract_deleted_run_hours,
+    lock_run_hours_assets
+)
+from app.metrics import EVENTS_PROCESSED
+from app.event_buffer import STATE_OFF, STATE_ON, EventBuffer, state_code
+from app.run_hour_vectorized import (
+    EPOCH_ORDINAL, UAE_OFFSET_MS, buffer_arrays, compute_daily_on_ms, datetime_to_epoch_ms,
+    epoch_ms_to_datetime, uae_dates_of
+)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Enable debug logging
 
 uae_tz = timezone(timedelta(hours=4))
 MILLISECONDS_IN_DAY = 86400000  # 24*60*60*1000
+ONE_MILLISECOND = timedelta(milliseconds=1)  # integer division avoids float rounding
 
 def utc_to_uae(dt_utc):
     """Convert UTC datetime to UAE timezone with validation"""
@@ -26,14 +36,15 @@ def utc_to_uae(dt_utc):
     return dt_utc.astimezone(uae_tz)
 
 def _process_duration(start_dt, end_dt, daily_on_milliseconds):
-    """Distribute duration across calendar days with debug logging"""
-    logger.debug(f"Processing duration from {start_dt} to {end_dt}")
-    
-    duration_ms = int((end_dt - start_dt).total_seconds() * 1000)
-    logger.debug(f"Total duration: {duration_ms}ms")
+    """Distribute duration across calendar days; debug messages are only built when DEBUG is enabled"""
+    debug = logger.isEnabledFor(logging.DEBUG)
+    duration_ms = (end_dt - start_dt) // ONE_MILLISECOND
+    if debug:
+        logger.debug(f"Processing duration from {start_dt} to {end_dt}: {duration_ms}ms")
     
     if duration_ms <= 0:
-        logger.debug("Zero or negative duration skipped")
+        if debug:
+            logger.debug("Zero or negative duration skipped")
         return
 
     remaining_ms = duration_ms
@@ -42,24 +53,20 @@ def _process_duration(start_dt, end_dt, daily_on_milliseconds):
     while remaining_ms > 0:
         day = current_time.date()
         day_end = datetime.combine(day + timedelta(days=1), time.min).replace(tzinfo=uae_tz)
-        chunk_ms = min(int((day_end - current_time).total_seconds() * 1000), remaining_ms)
+        chunk_ms = min((day_end - current_time) // ONE_MILLISECOND, remaining_ms)
         
-        logger.debug(f"Adding {chunk_ms}ms to {day} (current_time: {current_time}, day_end: {day_end})")
+        if debug:
+            logger.debug(f"Adding {chunk_ms}ms to {day} (current_time: {current_time}, day_end: {day_end})")
         
         daily_on_milliseconds[day] += chunk_ms
         remaining_ms -= chunk_ms
         current_time = day_end
-        
-        if remaining_ms > 0:
-            logger.debug(f"Continuing with {remaining_ms}ms remaining")
 
-def _force_update_hours(pg_conn, thingid, start_date, end_date, records, force_update):
-    """Enhanced force update with validation"""
+def _force_update_hours(pg_conn, thingid, start_date, end_date, records, force_update, trailing_state=None):
+    """Enhanced force update with validation; trailing_state is saved in the same transaction"""
     try:
         with pg_conn.cursor() as cur:
-            # Set timezone explicitly
-            cur.execute("SET TIME ZONE 'Asia/Dubai';")
-
+            # Connections are in UAE time via apply_session_settings
             if force_update:
                 # Verify existing records before deletion
                 cur.execute("""
@@ -73,12 +80,14 @@ def _force_update_hours(pg_conn, thingid, start_date, end_date, records, force_u
                 existing_count = cur.fetchone()[0]
                 logger.info(f"Found {existing_count} existing records to replace")
 
-                # Delete by date range
+                # Delete by date range, holding the asset's write lock (see lock_run_hours_assets)
+                lock_run_hours_assets(cur, [thingid])
                 delete_query = """
                     DELETE FROM run_hours 
                     WHERE thingid = %s 
                     AND datadate >= %s 
                     AND datadate < %s
+                    RETURNING thingid, datadate, on_hours, off_hours
                 """
                 cur.execute(delete_query, (
                     thingid,
@@ -86,19 +95,12 @@ def _force_update_hours(pg_conn, thingid, start_date, end_date, records, force_u
                     datetime.combine(end_date, time.min).replace(tzinfo=uae_tz) + timedelta(days=1)
                 ))
                 logger.info(f"Deleted {cur.rowcount} existing records")
+                subtract_deleted_run_hours(cur)
 
             # Insert new records with conflict handling
-            execute_batch(cur, """
-                INSERT INTO run_hours (thingid, datadate, on_hours, off_hours)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (thingid, datadate) 
-                DO UPDATE SET 
-                    on_hours = EXCLUDED.on_hours,
-                    off_hours = EXCLUDED.off_hours
-            """, [
-                (r["thingid"], r["datadate"], r["on_hours"], r["off_hours"])
-                for r in records
-            ])
+            write_run_hours(cur, records)
+            if trailing_state:
+                upsert_run_hour_state(cur, thingid, trailing_state)
             
             pg_conn.commit()
             logger.info(f"Upserted {len(records)} records")
@@ -108,122 +110,338 @@ def _force_update_hours(pg_conn, thingid, start_date, end_date, records, force_u
         logger.error(f"Database operation failed: {str(e)}", exc_info=True)
         raise
 
-def process_asset_for_date(thingid, cassandra_session, pg_conn, start_date, end_date, force_update=False):
-    """Enhanced processing with validation checks"""
-    try:
-        logger.info(f"Processing {thingid} from {start_date} to {end_date} (force_update={force_update})")
-        
-        # Convert dates to UAE timezone at midnight
-        uae_start = datetime.combine(start_date, time.min).replace(tzinfo=uae_tz)
-        uae_end = datetime.combine(end_date, time.min).replace(tzinfo=uae_tz) + timedelta(days=1)
-        
-        # Initialize tracking
-        daily_on_milliseconds = defaultdict(int)
-        days_with_logs = set()
-        current_on_start = None
-        max_on_duration = timedelta(hours=24)
-        total_logs_processed = 0
-
-        # Process each day in range
-        current_date = start_date
-        while current_date <= end_date:
-            cassandra_date = datetime.combine(current_date, time.min).replace(tzinfo=uae_tz).astimezone(timezone.utc).date()
-            logs = fetch_logs_for_day(cassandra_session, thingid, cassandra_date)
-            logger.info(f"Fetched {len(logs)} logs for {thingid} on {current_date}")
-
-            if logs:
-                days_with_logs.add(current_date)
-                previous_state = None
-                
-                for dt_utc, state in logs:
-                    state = state.upper().strip()
-                    dt_uae = utc_to_uae(dt_utc)
-                    total_logs_processed += 1
-                    
-                    # Debug boundary checks
-                    if dt_uae.date() != current_date:
-                        logger.warning(
-                            f"Log crosses date boundary: {dt_utc} UTC -> {dt_uae} UAE "
-                            f"(expected date: {current_date})"
+class RunHourCalculator:
+    """
+    ON/OFF state machine for one asset over a range of UAE days.
+
+    Log streams are fed in datatime order with add_logs(), or as EventBuffer pages
+    with add_events(); finish() closes a hanging
+    ON interval and returns the per-day ON milliseconds. open_on_start carries an
+    ON interval left open by the previous run, and
+    trailing_state() describes the state to hand over to the next run.
+    Data quality issues are counted in warning_counts and reported once per
+    asset instead of once per event.
+
+    engine selects the calculation: 'python' walks the events one by one, 'numpy'
+    buffers them as int64 epoch milliseconds and state codes and computes the
+    per-day totals with run_hour_vectorized (default: settings.RUN_HOUR_ENGINE).
+    """
+
+    max_on_duration = timedelta(hours=24)
+
+    def __init__(self, thingid, start_date, end_date, engine=None, open_on_start=None):
+        self.thingid = thingid
+        self.start_date = start_date
+        self.end_date = end_date
+        self.engine = engine or settings.RUN_HOUR_ENGINE
+        self.uae_start = datetime.combine(start_date, time.min).replace(tzinfo=uae_tz)
+        self.uae_end = self.uae_start + timedelta(days=(end_date - start_date).days + 1)
+        self.daily_on_milliseconds = defaultdict(int)
+        self.days_with_logs = set()
+        self.current_on_start = open_on_start.astimezone(uae_tz) if open_on_start else None
+        self.open_on_start = self.current_on_start
+        self.total_logs_processed = 0
+        self.warning_counts = Counter()
+        if self.engine == "numpy":
+            self.events = EventBuffer()
+
+    def add_logs(self, logs):
+        """Consume a (datatime_utc, state) stream, e.g. one partition; returns the number of logs"""
+        if self.engine == "numpy":
+            return self._buffer_logs(logs)
+        return self._process_logs(logs)
+
+    def add_events(self, buffers):
+        """Consume EventBuffer pages of one partition in datatime order; returns the number of events"""
+        if self.engine == "numpy":
+            events_before = len(self.events)
+            for buffer in buffers:
+                self.events.extend(buffer)
+            added = len(self.events) - events_before
+            self.total_logs_processed += added
+            return added
+        return self._process_events(buffers)
+
+    def _buffer_logs(self, logs):
+        logs_on_day = 0
+        for dt_utc, state in logs:
+            logs_on_day += 1
+            self.events.timestamps.append(datetime_to_epoch_ms(dt_utc))
+            self.events.codes.append(state_code(state))
+        self.total_logs_processed += logs_on_day
+        return logs_on_day
+
+    def _process_events(self, buffers):
+        """The per-event state machine over epoch milliseconds and state codes; datetimes are
+        only built at ON starts and OFF ends"""
+        previous_code = None
+        last_day_number = None
+        events_added = 0
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        for buffer in buffers:
+            events_added += len(buffer)
+            for ts_ms, code in zip(buffer.timestamps, buffer.codes):
+                day_number = (ts_ms + UAE_OFFSET_MS) // MILLISECONDS_IN_DAY
+                if day_number != last_day_number:
+                    self.days_with_logs.add(date.fromordinal(EPOCH_ORDINAL + day_number))
+                    last_day_number = day_number
+
+                if code == STATE_ON:
+                    if self.current_on_start is None:
+                        self.current_on_start = epoch_ms_to_datetime(ts_ms, uae_tz)
+                    elif previous_code == STATE_ON:
+                        self.warning_counts["consecutive ON states"] += 1
+                        if debug:
+                            logger.debug(f"Consecutive ON states at {epoch_ms_to_datetime(ts_ms, uae_tz)}")
+                elif code == STATE_OFF:
+                    if self.current_on_start is not None:
+                        _process_duration(
+                            self.current_on_start, epoch_ms_to_datetime(ts_ms, uae_tz), self.daily_on_milliseconds
                         )
-
-                    logger.debug(f"Processing log #{total_logs_processed}: {dt_uae} | State: {state}")
-                    
-                    if state == "ON":
-                        if current_on_start is None:
-                            current_on_start = dt_uae
-                            logger.debug(f"ON state started at {dt_uae}")
-                        elif previous_state == "ON":
-                            logger.warning(f"Consecutive ON states at {dt_uae}")
-                    elif state == "OFF":
-                        if current_on_start is not None:
-                            _process_duration(current_on_start, dt_uae, daily_on_milliseconds)
-                            current_on_start = None
-                            logger.debug(f"OFF state at {dt_uae}")
-                        elif previous_state == "OFF":
-                            logger.warning(f"Consecutive OFF states at {dt_uae}")
-                    
-                    previous_state = state
+                        self.current_on_start = None
+                    elif previous_code == STATE_OFF:
+                        self.warning_counts["consecutive OFF states"] += 1
+                        if debug:
+                            logger.debug(f"Consecutive OFF states at {epoch_ms_to_datetime(ts_ms, uae_tz)}")
+                previous_code = code
+
+        self.total_logs_processed += events_added
+        return events_added
+
+    def _process_logs(self, logs):
+        previous_state = None
+        logs_on_day = 0
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        for dt_utc, state in logs:
+            logs_on_day += 1
+            state = state.upper().strip()
+            dt_uae = utc_to_uae(dt_utc)
+            self.total_logs_processed += 1
+            self.days_with_logs.add(dt_uae.date())
+
+            if debug:
+                logger.debug(f"Processing log #{self.total_logs_processed}: {dt_uae} | State: {state}")
             
-            current_date += timedelta(days=1)
+            if state == "ON":
+                if self.current_on_start is None:
+                    self.current_on_start = dt_uae
+                elif previous_state == "ON":
+                    self.warning_counts["consecutive ON states"] += 1
+                    if debug:
+                        logger.debug(f"Consecutive ON states at {dt_uae}")
+            elif state == "OFF":
+                if self.current_on_start is not None:
+                    _process_duration(self.current_on_start, dt_uae, self.daily_on_milliseconds)
+                    self.current_on_start = None
+                elif previous_state == "OFF":
+                    self.warning_counts["consecutive OFF states"] += 1
+                    if debug:
+                        logger.debug(f"Consecutive OFF states at {dt_uae}")
+            
+            previous_state = state
+        return logs_on_day
+
+    def log_warning_summary(self):
+        """Log the aggregated data quality warnings of this asset, if any"""
+        if self.warning_counts:
+            summary = ", ".join(f"{count} {warning}" for warning, count in sorted(self.warning_counts.items()))
+            logger.warning(f"Data quality warnings for {self.thingid} ({self.start_date} to {self.end_date}): {summary}")
+
+    def finish(self):
+        """
+        Close any hanging ON state and return the results
+        Returns:
+            tuple: (daily_on_milliseconds, days_with_logs)
+        """
+        if self.engine == "numpy":
+            open_start_ms = datetime_to_epoch_ms(self.current_on_start) if self.current_on_start else None
+            event_ts_ms, event_codes = buffer_arrays(self.events.timestamps, self.events.codes)
+            self.daily_on_milliseconds, open_start_ms = compute_daily_on_ms(
+                event_ts_ms, event_codes, self.start_date, self.end_date,
+                self.max_on_duration // ONE_MILLISECOND, open_start_ms
+            )
+            self.current_on_start = epoch_ms_to_datetime(open_start_ms, uae_tz) if open_start_ms is not None else None
+            if open_start_ms is not None:
+                self.warning_counts["hanging ON states auto-terminated"] += 1
+            self.days_with_logs = uae_dates_of(event_ts_ms)
 
         # Handle any hanging ON state
-        if current_on_start is not None:
-            end_time = min(uae_end, current_on_start + max_on_duration)
-            logger.warning(f"Auto-terminating hanging ON state started at {current_on_start}")
-            _process_duration(current_on_start, end_time, daily_on_milliseconds)
-
-        # Validation: Check total calculated time
-        total_calculated_ms = sum(daily_on_milliseconds.values())
-        expected_ms = (uae_end - uae_start).total_seconds() * 1000 * (end_date - start_date).days
-        time_discrepancy = abs(total_calculated_ms - expected_ms)
-        
-        if time_discrepancy > 1000:  # 1 second tolerance
-            logger.error(
-                f"Time calculation mismatch! Calculated: {total_calculated_ms}ms, "
-                f"Expected: ~{expected_ms}ms, Difference: {time_discrepancy}ms"
-            )
+        elif self.current_on_start is not None:
+            end_time = min(self.uae_end, self.current_on_start + self.max_on_duration)
+            self.warning_counts["hanging ON states auto-terminated"] += 1
+            _process_duration(self.current_on_start, end_time, self.daily_on_milliseconds)
+
+        return self.daily_on_milliseconds, self.days_with_logs
+
+    def partial_on_milliseconds(self, until):
+        """
+        Per-day ON milliseconds so far without closing the open ON interval, which is
+        counted up to until (capped like a hanging ON). Python engine only, as the
+        numpy engine computes nothing before finish().
+        Returns:
+            dict: {date: on_milliseconds}
+        """
+        daily = defaultdict(int, self.daily_on_milliseconds)
+        if self.current_on_start is not None:
+            end_time = min(until, self.current_on_start + self.max_on_duration)
+            _process_duration(self.current_on_start, end_time, daily)
+        return daily
+
+    def trailing_state(self):
+        """
+        State to persist for the next run, after finish()
+        Returns:
+            dict: {'last_state', 'open_on_start', 'valid_through', 'range_start', 'range_open_on_start'};
+                  range_* is the state this range started from, so it can be recalculated alone
+        """
+        return {
+            'last_state': "ON" if self.current_on_start is not None else "OFF",
+            'open_on_start': self.current_on_start,
+            'valid_through': self.end_date,
+            'range_start': self.start_date,
+            'range_open_on_start': self.open_on_start
+        }
+
+def begin_calculation(thingid, pg_conn, start_date, end_date, engine=None):
+    """
+    Build the calculator for one (thingid, range) unit
+
+    A range that starts the day after the asset's persisted state continues from it,
+    so an ON interval open at midnight is counted without re-reading older partitions.
+    A range that starts on the same day as the range that produced the state, e.g. a
+    --force rerun of the last nightly day, starts from the state that range started from.
+
+    Any other range starts with no open ON interval: ON time from its first midnight to
+    its first event is not counted, so rerunning a range that starts before the last
+    calculated range can give a smaller first-day total than the run that stored it.
+
+    Returns:
+        tuple: (calculator, persisted_state) where persisted_state is passed on to complete_calculation
+    """
+    persisted_state = get_run_hour_state(pg_conn, thingid)
+    open_on_start = None
+    if persisted_state and persisted_state['valid_through'] == start_date - timedelta(days=1):
+        open_on_start = persisted_state['open_on_start']
+        logger.debug(f"Continuing {thingid} from state {persisted_state}")
+    elif persisted_state and persisted_state['range_start'] == start_date:
+        open_on_start = persisted_state['range_open_on_start']
+        logger.debug(f"Recalculating {thingid} from the start of its last range ({start_date})")
+    calculator = RunHourCalculator(thingid, start_date, end_date, engine, open_on_start=open_on_start)
+    return calculator, persisted_state
+
+def complete_calculation(calculator, persisted_state, pg_conn, force_update=False):
+    """
+    Finish a calculator fed with all partitions of its range, validate the totals and
+    store the run hours; the trailing state is saved in the same transaction
+    """
+    thingid, start_date, end_date = calculator.thingid, calculator.start_date, calculator.end_date
+    uae_start, uae_end = calculator.uae_start, calculator.uae_end
+
+    daily_on_milliseconds, days_with_logs = calculator.finish()
+    total_logs_processed = calculator.total_logs_processed
+    EVENTS_PROCESSED.inc(total_logs_processed)
+    calculator.log_warning_summary()
+
+    # Only move the persisted state forward, never back to an older range
+    trailing_state = None
+    if persisted_state is None or end_date >= persisted_state['valid_through']:
+        trailing_state = calculator.trailing_state()
+
+    # Validation: Check total calculated time
+    total_calculated_ms = sum(daily_on_milliseconds.values())
+    expected_ms = (uae_end - uae_start).total_seconds() * 1000 * (end_date - start_date).days
+    time_discrepancy = abs(total_calculated_ms - expected_ms)
+    
+    if time_discrepancy > 1000:  # 1 second tolerance
+        logger.error(
+            f"Time calculation mismatch! Calculated: {total_calculated_ms}ms, "
+            f"Expected: ~{expected_ms}ms, Difference: {time_discrepancy}ms"
+        )
 
-        # Prepare database records
-        records_to_upsert = []
-        current_date = start_date
-        while current_date <= end_date:
-            record_date = datetime.combine(current_date, time.min).replace(tzinfo=uae_tz)
-            
-            if current_date in days_with_logs:
-                on_ms = daily_on_milliseconds.get(current_date, 0)
-                off_ms = MILLISECONDS_IN_DAY - on_ms
+    # Prepare database records, skipping days already stored unless forcing
+    existing_dates = set() if force_update else get_existing_run_hour_dates(
+        pg_conn, thingid, start_date, end_date
+    )
+    records_to_upsert = []
+    days_without_logs = 0
+    debug = logger.isEnabledFor(logging.DEBUG)
+    current_date = start_date
+    while current_date <= end_date:
+        record_date = datetime.combine(current_date, time.min).replace(tzinfo=uae_tz)
+        
+        if current_date in days_with_logs:
+            on_ms = daily_on_milliseconds.get(current_date, 0)
+            off_ms = MILLISECONDS_IN_DAY - on_ms
+            if debug:
                 logger.debug(f"Date {current_date}: ON={on_ms}ms, OFF={off_ms}ms")
-            else:
-                on_ms = 0
-                off_ms = MILLISECONDS_IN_DAY
-                logger.info(f"No logs for {current_date}, defaulting to 0ms ON time")
+        else:
+            on_ms = 0
+            off_ms = MILLISECONDS_IN_DAY
+            days_without_logs += 1
 
-            if not force_update and run_hour_exists(pg_conn, thingid, record_date):
+        if current_date in existing_dates:
+            if debug:
                 logger.debug(f"Skipping existing record for {current_date}")
-                current_date += timedelta(days=1)
-                continue
-
-            records_to_upsert.append({
-                "thingid": thingid,
-                "datadate": record_date,
-                "on_hours": on_ms,
-                "off_hours": off_ms
-            })
             current_date += timedelta(days=1)
+            continue
+
+        records_to_upsert.append({
+            "thingid": thingid,
+            "datadate": record_date,
+            "on_hours": on_ms,
+            "off_hours": off_ms
+        })
+        current_date += timedelta(days=1)
+
+    if days_without_logs:
+        logger.info(f"No logs for {thingid} on {days_without_logs} day(s), defaulting to 0ms ON time")
+
+    # Execute the update; the trailing state is committed together with the rows
+    if records_to_upsert:
+        _force_update_hours(pg_conn, thingid, start_date, end_date, records_to_upsert, force_update,
+                            trailing_state)
+    else:
+        logger.info("No records to update")
+        if trailing_state:
+            save_run_hour_state(pg_conn, thingid, trailing_state)
+
+    logger.info(
+        f"Processing complete for {thingid}. "
+        f"Total logs processed: {total_logs_processed}, "
+        f"Days with logs: {len(days_with_logs)}"
+    )
+
+def process_asset_for_date(thingid, cassandra_session, pg_conn, start_date, end_date, force_update=False,
+                           engine=None):
+    """
+    Enhanced processing with validation checks
+
+    A run that starts the day after the asset's persisted state continues from it,
+    so an ON interval open at midnight is counted without re-reading older
+    partitions; the trailing state is saved with the run hour rows.
+    """
+    engine = engine or settings.RUN_HOUR_ENGINE
+    try:
+        logger.info(f"Processing {thingid} from {start_date} to {end_date} (force_update={force_update}, engine={engine})")
 
-        # Execute the update
-        if records_to_upsert:
-            _force_update_hours(pg_conn, thingid, start_date, end_date, records_to_upsert, force_update)
-        else:
-            logger.info("No records to update")
+        calculator, persisted_state = begin_calculation(thingid, pg_conn, start_date, end_date, engine)
 
-        logger.info(
-            f"Processing complete for {thingid}. "
-            f"Total logs processed: {total_logs_processed}, "
-            f"Days with logs: {len(days_with_logs)}"
+        # Read the UTC partitions covering the UAE range concurrently, consuming them in
+        # day order; the datatime window keeps logs outside the range out of the calculation
+        partitions = fetch_logs_for_range(
+            cassandra_session, thingid, partitions_for_uae_range(start_date, end_date),
+            window=(calculator.uae_start, calculator.uae_end), columnar=True
         )
 
+        for partition_date, pages in partitions:
+            # Pages arrive as columnar EventBuffers in datatime order
+            logs_in_partition = calculator.add_events(pages)
+            logger.info(f"Fetched {logs_in_partition} logs for {thingid} from partition {partition_date}")
+
+        complete_calculation(calculator, persisted_state, pg_conn, force_update)
+
     except Exception as e:
         logger.error(f"Error processing {thingid}: {str(e)}", exc_info=True)
         raise
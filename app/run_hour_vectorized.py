@@ -0,0 +1,126 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from app.event_buffer import STATE_OFF, STATE_ON
+
+MILLISECONDS_IN_DAY = 86400000  # 24*60*60*1000
+UAE_OFFSET_MS = 4 * 3600 * 1000
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def buffer_arrays(timestamps, codes):
+    """Zero-copy int64 / int8 views of an array('q') of epoch milliseconds and a bytearray of state codes"""
+    return np.frombuffer(timestamps, dtype=np.int64), np.frombuffer(codes, dtype=np.int8)
+
+
+def datetime_to_epoch_ms(dt):
+    """Convert a timezone-aware datetime to integer epoch milliseconds without float rounding"""
+    return int(dt.timestamp()) * 1000 + dt.microsecond // 1000
+
+
+def epoch_ms_to_datetime(ms, tz):
+    """Convert integer epoch milliseconds to a datetime in tz"""
+    return datetime.fromtimestamp(ms // 1000, tz) + timedelta(milliseconds=ms % 1000)
+
+
+def uae_day_edges_ms(start_date, n_days):
+    """Epoch milliseconds of the UAE midnights from start_date to start_date + n_days (inclusive)"""
+    first_edge = (start_date.toordinal() - EPOCH_ORDINAL) * MILLISECONDS_IN_DAY - UAE_OFFSET_MS
+    return first_edge + np.arange(n_days + 1, dtype=np.int64) * MILLISECONDS_IN_DAY
+
+
+def uae_dates_of(ts_ms):
+    """Set of UAE calendar dates the given epoch-millisecond timestamps fall on"""
+    day_numbers = np.unique((np.asarray(ts_ms, dtype=np.int64) + UAE_OFFSET_MS) // MILLISECONDS_IN_DAY)
+    return {date.fromordinal(EPOCH_ORDINAL + int(day_number)) for day_number in day_numbers}
+
+
+def on_intervals(ts_ms, codes, open_start_ms=None):
+    """
+    Pair ON starts with OFF ends the same way the sequential state machine does:
+    an ON opens an interval unless one is already open, an OFF closes the open one,
+    and any other state is ignored.
+
+    Args:
+        ts_ms: int64 epoch-millisecond timestamps in ascending order
+        codes: State codes (STATE_ON / STATE_OFF / STATE_OTHER) aligned with ts_ms
+        open_start_ms: Start of an ON interval still open before the first event
+
+    Returns:
+        tuple: (starts, ends, open_start_ms) where starts/ends are int64 arrays of closed
+        intervals and open_start_ms is the start of the interval left open (or None)
+    """
+    ts_ms = np.asarray(ts_ms, dtype=np.int64)
+    codes = np.asarray(codes, dtype=np.int8)
+
+    relevant = (codes == STATE_ON) | (codes == STATE_OFF)
+    ts_ms = ts_ms[relevant]
+    is_on = codes[relevant] == STATE_ON
+    if open_start_ms is not None:
+        ts_ms = np.concatenate((np.array([open_start_ms], dtype=np.int64), ts_ms))
+        is_on = np.concatenate((np.array([True]), is_on))
+    if not len(ts_ms):
+        return _EMPTY, _EMPTY, None
+
+    was_on = np.empty_like(is_on)
+    was_on[0] = False
+    was_on[1:] = is_on[:-1]
+
+    starts = ts_ms[is_on & ~was_on]
+    ends = ts_ms[~is_on & was_on]
+    if len(starts) > len(ends):
+        return starts[:-1], ends, int(starts[-1])
+    return starts, ends, None
+
+
+def on_ms_per_day(starts, ends, day_edges_ms):
+    """
+    Total ON milliseconds inside each [day_edges_ms[i], day_edges_ms[i + 1]) window.
+
+    Uses the cumulative ON time F(t) evaluated at every day edge with searchsorted,
+    so intervals crossing midnight are clipped without iterating over them.
+    Intervals must be non-overlapping and in ascending order.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    positive = ends > starts
+    starts, ends = starts[positive], ends[positive]
+    if not len(starts):
+        return np.zeros(len(day_edges_ms) - 1, dtype=np.int64)
+
+    cumulative = np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(ends - starts)))
+    finished = np.searchsorted(ends, day_edges_ms, side='right')
+    in_progress = np.minimum(finished, len(starts) - 1)
+    partial = np.where(
+        (finished < len(starts)) & (starts[in_progress] < day_edges_ms),
+        day_edges_ms - starts[in_progress],
+        0
+    )
+    return np.diff(cumulative[finished] + partial)
+
+
+def compute_daily_on_ms(ts_ms, codes, start_date, end_date, max_on_duration_ms, open_start_ms=None):
+    """
+    Vectorized equivalent of the per-event loop in RunHourCalculator.
+
+    open_start_ms carries an ON interval left open by an earlier run. An interval
+    still open after the last event is counted up to the end of the range or
+    max_on_duration_ms after its start, whichever comes first.
+
+    Returns:
+        tuple: ({date: on_milliseconds} for every date from start_date to end_date,
+        start of the ON interval still open after the last event or None)
+    """
+    n_days = (end_date - start_date).days + 1
+    edges = uae_day_edges_ms(start_date, n_days)
+    starts, ends, open_start_ms = on_intervals(ts_ms, codes, open_start_ms)
+
+    if open_start_ms is not None:
+        hanging_end = min(int(edges[-1]), open_start_ms + max_on_duration_ms)
+        starts = np.append(starts, open_start_ms)
+        ends = np.append(ends, hanging_end)
+
+    per_day = on_ms_per_day(starts, ends, edges)
+    daily = {start_date + timedelta(days=offset): int(on_ms) for offset, on_ms in enumerate(per_day)}
+    return daily, open_start_ms
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import threading
+import time
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal:
+    """
+    Append-only JSON lines journal of the work a run has finished.
+
+    The first line identifies the run (its run_key); each further line records either
+    a completed (thingid, start, end, force) unit or an asset whose processing
+    finished. Every record is flushed and fsynced, so after a crash the journal holds
+    exactly the work that was committed. With resume=True a journal written for the
+    same run_key is loaded and extended; otherwise a new journal is started.
+    """
+
+    def __init__(self, run_key, path=None, resume=False):
+        self.path = path or settings.RUN_JOURNAL_PATH
+        self.run_key = run_key
+        self.completed_units = set()
+        self.completed_assets = set()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        resumed = resume and self._load()
+        self._file = open(self.path, "a" if resumed else "w", encoding="utf-8")
+        if resumed:
+            logger.info(
+                f"Resuming from {self.path}: {len(self.completed_assets)} assets and "
+                f"{len(self.completed_units)} ranges already done"
+            )
+        else:
+            self._append({"type": "run", "run_key": run_key, "started": int(time.time() * 1000)})
+
+    def _load(self):
+        """Load a journal for the same run_key; returns False when there is nothing to resume"""
+        try:
+            with open(self.path, "rb") as journal_file:
+                lines = journal_file.readlines()
+        except FileNotFoundError:
+            logger.warning(f"No run journal at {self.path}; starting a new run")
+            return False
+
+        valid_bytes = 0
+        for index, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final write from the crash; drop it and everything after it
+                break
+            if index == 0:
+                if record.get("type") != "run" or record.get("run_key") != self.run_key:
+                    logger.warning(f"Run journal {self.path} belongs to a different run; starting a new run")
+                    return False
+            elif record["type"] == "unit":
+                self.completed_units.add(
+                    (record["thingid"], record["start"], record["end"], record["force"])
+                )
+            elif record["type"] == "asset":
+                self.completed_assets.add(record["thingid"])
+            valid_bytes += len(line)
+
+        if valid_bytes == 0:
+            return False
+        with open(self.path, "r+b") as journal_file:
+            journal_file.truncate(valid_bytes)
+        return True
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def unit_done(self, thingid, start_date, end_date, force_update):
+        return (thingid, start_date.isoformat(), end_date.isoformat(), force_update) in self.completed_units
+
+    def asset_done(self, thingid):
+        return thingid in self.completed_assets
+
+    def record_unit(self, thingid, start_date, end_date, force_update):
+        unit = (thingid, start_date.isoformat(), end_date.isoformat(), force_update)
+        self._append({"type": "unit", "thingid": thingid, "start": unit[1], "end": unit[2], "force": force_update})
+        with self._lock:
+            self.completed_units.add(unit)
+
+    def record_asset(self, thingid, status):
+        self._append({"type": "asset", "thingid": thingid, "status": status})
+        with self._lock:
+            self.completed_assets.add(thingid)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard_spec(spec):
+    """
+    Parse a 'K/N' shard spec
+    Args:
+        spec: Shard index and count, e.g. '0/4'
+    Returns:
+        tuple: (index, count) with 0 <= index < count
+    Raises ValueError on a malformed spec
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec {spec!r}; expected K/N, e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard spec {spec!r}; K must be between 0 and N-1")
+    return index, count
+
+
+def shard_of(identifier, count):
+    """Stable shard of an asset identifier; crc32 is the same in every process and on every host"""
+    return zlib.crc32(identifier.encode("utf-8")) % count
+
+
+def select_shard(assets, index, count):
+    """Assets owned by shard index of count"""
+    return [asset for asset in assets if shard_of(asset['identifier'], count) == index]
+
+
+def sub_shards(index, count, processes):
+    """
+    Split shard index/count into `processes` disjoint shards of index/count * processes.
+
+    An asset with crc32 % (count * processes) == index + count * i also has
+    crc32 % count == index, so the sub-shards exactly cover the parent shard.
+    """
+    return [(index + count * i, count * processes) for i in range(processes)]
+
+
+def shard_path(path, index, count):
+    """Per-shard variant of a file path, e.g. run_journal.jsonl -> run_journal.shard-0-of-4.jsonl"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{index}-of-{count}{ext}"
+
+
+def run_shard_processes(shards, child_argv):
+    """
+    Run one `python -m app.main` child per shard and aggregate their results
+
+    Args:
+        shards: List of (index, count) shards, one child each
+        child_argv: Callable (shard_spec, summary_path) -> list of command line arguments
+    Returns:
+        int: Exit code for the parent, 1 if any child failed or reported failed assets
+    """
+    summary_dir = tempfile.mkdtemp(prefix="run_hours_shards_")
+    children = []
+    for index, count in shards:
+        spec = f"{index}/{count}"
+        summary_path = os.path.join(summary_dir, f"shard-{index}-of-{count}.json")
+        command = [sys.executable, "-m", "app.main"] + child_argv(spec, summary_path)
+        logger.info(f"Starting shard {spec}: {' '.join(command)}")
+        children.append((spec, summary_path, subprocess.Popen(command)))
+
+    totals = {'assets': 0, 'processed': 0, 'skipped': 0, 'failed': 0}
+    exit_code = 0
+    for spec, summary_path, process in children:
+        return_code = process.wait()
+        try:
+            with open(summary_path, encoding="utf-8") as summary_file:
+                summary = json.load(summary_file)
+            os.remove(summary_path)
+        except (OSError, ValueError):
+            summary = None
+
+        if summary is None:
+            logger.error(f"Shard {spec} exited with {return_code} without a summary")
+        else:
+            for key in totals:
+                totals[key] += summary[key]
+            logger.info(
+                f"Shard {spec}: {summary['assets']} assets - {summary['processed']} processed, "
+                f"{summary['skipped']} skipped, {summary['failed']} failed (exit {return_code})"
+            )
+        if return_code != 0 or summary is None:
+            exit_code = 1
+
+    try:
+        os.rmdir(summary_dir)
+    except OSError:
+        pass
+
+    logger.info(
+        f"All shards: {totals['assets']} assets - {totals['processed']} processed, "
+        f"{totals['skipped']} skipped, {totals['failed']} failed"
+    )
+    return exit_code
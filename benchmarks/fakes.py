@@ -0,0 +1,337 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from app.cassandra_ops import EVENT_BUFFER_PROFILE
+from app.event_buffer import event_buffer_row_factory
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MILLISECOND = timedelta(milliseconds=1)
+
+
+class BenchmarkStats:
+    """Thread-safe counters shared by the fake Cassandra session and PostgreSQL connections"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'cassandra_requests': 0,
+            'rows_read': 0,
+            'postgres_statements': 0,
+            'postgres_commits': 0,
+            'rows_written': 0
+        }
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def _naive_utc(dt):
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+class FakeBoundStatement:
+    def __init__(self, prepared, values):
+        self.prepared = prepared
+        self.values = tuple(values)
+        self.fetch_size = None
+
+
+class FakePreparedStatement:
+    def __init__(self, cql):
+        self.cql = cql
+        self.is_probe = "LIMIT 1" in cql
+        self.after = "datatime > ?" in cql
+        self.epoch_ms = "toUnixTimestamp(datatime)" in cql
+
+    def bind(self, values):
+        return FakeBoundStatement(self, values)
+
+
+class FakeResultSet:
+    """
+    Paged result set: iterating yields the first page at once and pays one more
+    round trip of latency per further page, like the driver's transparent paging.
+    Rows are counted in the stats the first time their page is handed out.
+    """
+
+    def __init__(self, rows, fetch_size, session, row_factory=None):
+        self._rows = rows
+        self._fetch_size = fetch_size or 5000
+        self._session = session
+        self._row_factory = row_factory
+        self._counted_pages = set()
+
+    def page_count(self):
+        return max(1, -(-len(self._rows) // self._fetch_size))
+
+    def page(self, index):
+        """Rows of page `index` as the driver hands them to callbacks (after the row factory)"""
+        rows = self._rows[index * self._fetch_size:(index + 1) * self._fetch_size]
+        if index not in self._counted_pages:
+            self._counted_pages.add(index)
+            self._session.stats.add('rows_read', len(rows))
+        return self._row_factory(None, rows) if self._row_factory else rows
+
+    def __iter__(self):
+        for index in range(self.page_count()):
+            if index:
+                self._session._round_trip()
+            yield from self.page(index)
+
+    def one(self):
+        return next(iter(self.page(0)), None)
+
+
+class FakeResponseFuture:
+    """
+    execute_async result that becomes ready `latency` seconds after it was sent
+
+    Like the driver's ResponseFuture, callbacks get only the current page;
+    has_more_pages tells whether another one follows, and start_fetching_next_page()
+    requests it and runs the callbacks again with it after one more round trip.
+    result() returns the whole result set with transparent paging instead.
+    """
+
+    def __init__(self, result, ready_at, session):
+        self._result = result
+        self._ready_at = ready_at
+        self._session = session
+        self._callbacks = []
+        self._page = 0
+        self._delivered = False
+        self._lock = threading.Lock()
+
+    @property
+    def has_more_pages(self):
+        return self._page + 1 < self._result.page_count()
+
+    def add_callbacks(self, callback, errback):
+        # Callbacks run once the latency has passed, on a timer thread standing in for the
+        # driver's event loop, or when the result is first waited for, whichever is first
+        with self._lock:
+            self._callbacks.append(callback)
+            delivered = self._delivered
+        if delivered:
+            callback(self._result.page(self._page))
+        else:
+            self._deliver_at(self._ready_at)
+
+    def start_fetching_next_page(self):
+        if not self.has_more_pages:
+            raise Exception("No more pages to fetch")
+        with self._lock:
+            self._page += 1
+            self._delivered = False
+        self._session.stats.add('cassandra_requests')
+        self._deliver_at(time.perf_counter() + self._session.latency)
+
+    def _deliver_at(self, ready_at):
+        delay = ready_at - time.perf_counter()
+        if delay > 0:
+            timer = threading.Timer(delay, self._deliver)
+            timer.daemon = True
+            timer.start()
+        else:
+            self._deliver()
+
+    def _deliver(self):
+        with self._lock:
+            if self._delivered:
+                return
+            self._delivered = True
+            callbacks = list(self._callbacks)
+        if callbacks:
+            rows = self._result.page(self._page)
+            for callback in callbacks:
+                callback(rows)
+
+    def result(self):
+        delay = self._ready_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self._deliver()
+        return self._result
+
+
+class FakeCassandraSession:
+    """
+    Stand-in for a cassandra-driver Session over the big_data_store.run_status table.
+
+    Supports prepare(), bind(), execute(), execute_async(), paging and the
+    EVENT_BUFFER_PROFILE row factory for the queries in app.cassandra_ops; rows
+    come from an EventProfile. Requests in
+    flight overlap, so windowed execute_async reads see the same latency hiding
+    they would against a cluster.
+
+    Args:
+        profile: benchmarks.generator.EventProfile
+        stats: BenchmarkStats to count requests and rows
+        latency: Seconds per round trip (request or page)
+    """
+
+    def __init__(self, profile, stats, latency=0.0):
+        self.profile = profile
+        self.stats = stats
+        self.latency = latency
+
+    def prepare(self, cql):
+        return FakePreparedStatement(cql)
+
+    def _round_trip(self):
+        self.stats.add('cassandra_requests')
+        if self.latency:
+            time.sleep(self.latency)
+
+    row_factories = {EVENT_BUFFER_PROFILE: event_buffer_row_factory}
+
+    def _result_set(self, statement, parameters=None, execution_profile=None):
+        if not isinstance(statement, FakeBoundStatement):
+            statement = statement.bind(parameters or ())
+        prepared, values = statement.prepared, statement.values
+        rows = self.profile.partition_rows(values[0], _naive_utc(values[1]).date())
+
+        if len(values) == 4:
+            since, until = _naive_utc(values[2]), _naive_utc(values[3])
+            if prepared.after:
+                rows = [row for row in rows if since < row.datatime < until]
+            else:
+                rows = [row for row in rows if since <= row.datatime < until]
+        if prepared.is_probe:
+            rows = rows[:1]
+
+        if prepared.epoch_ms:
+            rows = [((row.datatime - _EPOCH) // _ONE_MILLISECOND, row.data) for row in rows]
+
+        return FakeResultSet(rows, statement.fetch_size, self, self.row_factories.get(execution_profile))
+
+    def execute_async(self, statement, parameters=None, execution_profile=None):
+        self.stats.add('cassandra_requests')
+        return FakeResponseFuture(
+            self._result_set(statement, parameters, execution_profile), time.perf_counter() + self.latency, self
+        )
+
+    def execute(self, statement, parameters=None, execution_profile=None):
+        return self.execute_async(statement, parameters, execution_profile).result()
+
+
+class FakeCursor:
+    """psycopg2 cursor stand-in answering the statements issued by app.postgres_ops"""
+
+    def __init__(self, database):
+        self.database = database
+        self.rowcount = -1
+        self._results = []
+        self._staged_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def close(self):
+        pass
+
+    def mogrify(self, sql, params=None):
+        return sql.encode("utf-8") if isinstance(sql, str) else sql
+
+    def execute(self, sql, params=None):
+        self.database._round_trip()
+        self._results = []
+        self.rowcount = 0
+
+        if isinstance(sql, bytes):
+            # execute_batch sends a page of mogrified statements joined with ';'
+            self.rowcount = sql.count(b"INSERT INTO run_hours ")
+            self.database.stats.add('rows_written', self.rowcount)
+        elif "FROM run_hour_state" in sql:
+            state = self.database.states.get(params[0])
+            self._results = [state] if state else []
+        elif "INSERT INTO run_hour_state" in sql:
+            self.database.states[params[0]] = tuple(params[1:6])
+        elif "FROM run_hours_stage" in sql:
+            self.rowcount, self._staged_rows = self._staged_rows, 0
+            self.database.stats.add('rows_written', self.rowcount)
+        elif "INSERT INTO run_hours " in sql:
+            self.rowcount = 1
+            self.database.stats.add('rows_written')
+        elif "COUNT(*)" in sql:
+            self._results = [(0,)]
+
+    def copy_expert(self, sql, file):
+        self.database._round_trip()
+        self._staged_rows += file.read().count("\n")
+
+    def fetchone(self):
+        return self._results[0] if self._results else None
+
+    def fetchall(self):
+        return list(self._results)
+
+
+class FakePostgresConnection:
+    def __init__(self, database):
+        self.database = database
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def commit(self):
+        self.database.stats.add('postgres_commits')
+        self.database._round_trip(count=False)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeConnections:
+    """ConnectionManager stand-in handing out the fake session and fake PostgreSQL connections"""
+
+    def __init__(self, session, database):
+        self.cassandra_session = session
+        self.database = database
+
+    @contextmanager
+    def postgres(self):
+        yield self.database.connect()
+
+
+class FakePostgresDatabase:
+    """
+    In-process stand-in for the run_hours database.
+
+    run_hours starts empty and writes are only counted, so every run writes every
+    row; run_hour_state is kept so chained runs carry state as they would.
+
+    Args:
+        stats: BenchmarkStats to count statements and written rows
+        latency: Seconds per statement round trip
+    """
+
+    def __init__(self, stats, latency=0.0):
+        self.stats = stats
+        self.latency = latency
+        self.states = {}
+
+    def _round_trip(self, count=True):
+        if count:
+            self.stats.add('postgres_statements')
+        if self.latency:
+            time.sleep(self.latency)
+
+    def connect(self):
+        return FakePostgresConnection(self)
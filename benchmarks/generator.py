@@ -0,0 +1,84 @@
+import random
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+# Same shape as the rows returned by the cassandra driver: naive UTC datatime and the raw state
+Row = namedtuple("Row", "datatime data")
+
+MILLISECONDS_IN_DAY = 86400000
+
+
+class EventProfile:
+    """
+    Shape of a synthetic run_status stream.
+
+    Every UTC partition of every asset is generated on demand from a seed derived
+    from (seed, thingid, date), so any partition can be read in any order without
+    holding the whole data set in memory and every run sees the same events.
+
+    Args:
+        events_per_day: Log rows per partition
+        crossing_ratio: Share of days whose last state is ON, leaving an interval
+                        open across midnight into the next partition
+        noise_ratio: Share of rows with a state other than ON/OFF (e.g. TRIP) or a
+                     repeated state, exercising the consecutive ON/OFF warnings
+        seed: Base seed
+    """
+
+    def __init__(self, events_per_day=200, crossing_ratio=0.3, noise_ratio=0.05, seed=42):
+        self.events_per_day = events_per_day
+        self.crossing_ratio = crossing_ratio
+        self.noise_ratio = noise_ratio
+        self.seed = seed
+
+    def as_dict(self):
+        return {
+            'events_per_day': self.events_per_day,
+            'crossing_ratio': self.crossing_ratio,
+            'noise_ratio': self.noise_ratio,
+            'seed': self.seed
+        }
+
+    def _rng(self, thingid, partition_date, purpose):
+        return random.Random(f"{self.seed}:{thingid}:{partition_date.isoformat()}:{purpose}")
+
+    def ends_on(self, thingid, partition_date):
+        """True when the partition's last state is ON, i.e. an interval crosses into the next day"""
+        return self._rng(thingid, partition_date, "crossing").random() < self.crossing_ratio
+
+    def partition_rows(self, thingid, partition_date):
+        """
+        Rows of one UTC partition in datatime order
+        Returns:
+            list: Row(datatime, data) with naive UTC datatimes
+        """
+        count = self.events_per_day
+        if count <= 0:
+            return []
+        rng = self._rng(thingid, partition_date, "events")
+        day_start = datetime.combine(partition_date, time.min)
+        offsets = sorted(rng.sample(range(MILLISECONDS_IN_DAY), count))
+
+        # Alternate states so ON intervals of varying length are closed by OFFs; the first
+        # state continues whatever the previous partition ended with
+        state_is_on = not self.ends_on(thingid, partition_date - timedelta(days=1))
+        states = []
+        for _ in range(count):
+            states.append("ON" if state_is_on else "OFF")
+            state_is_on = not state_is_on
+        if states[-1] != ("ON" if self.ends_on(thingid, partition_date) else "OFF"):
+            states[-1] = "ON" if states[-1] == "OFF" else "OFF"
+
+        for index in range(count - 1):
+            if rng.random() < self.noise_ratio:
+                states[index] = rng.choice(["TRIP", "On", "off ", states[index - 1] if index else "ON"])
+
+        return [
+            Row(day_start + timedelta(milliseconds=offset), state)
+            for offset, state in zip(offsets, states)
+        ]
+
+
+def asset_ids(count, prefix="AC_"):
+    """Deterministic asset identifiers AC_00000, AC_00001, ..."""
+    return [f"{prefix}{index:05d}" for index in range(count)]
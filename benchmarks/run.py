@@ -0,0 +1,205 @@
+"""
+Benchmarks for the read, calculation and write paths against in-process stand-ins.
+
+Usage:
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario backfill --engine numpy --output results.json
+    python -m benchmarks.run --cassandra-latency 0.002 --postgres-latency 0.001 --trace-memory
+
+The JSON report is written to a file, by default .cache/benchmarks/<git revision>.json,
+never to stdout: config.env_loader prints to stdout on import.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from app.cassandra_ops import fetch_logs_for_day
+from config.settings import settings
+from app.read_scheduler import ReadScheduler
+from app.run_hour_calculation import process_asset_for_date
+from benchmarks.fakes import BenchmarkStats, FakeCassandraSession, FakeConnections, FakePostgresDatabase
+from benchmarks.generator import EventProfile, asset_ids
+
+# Fixed dates so every run reads exactly the same partitions
+BENCHMARK_END_DATE = date(2025, 5, 31)
+
+
+def nightly_run(session, database, assets, days, engine, workers):
+    """One calculation per asset over the last `days` days, like the nightly cron run"""
+    start_date = BENCHMARK_END_DATE - timedelta(days=days - 1)
+
+    def run(thingid):
+        process_asset_for_date(thingid, session, database.connect(), start_date, BENCHMARK_END_DATE, engine=engine)
+
+    if workers == 1:
+        for thingid in assets:
+            run(thingid)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run, assets))
+
+
+def scheduled_run(session, database, assets, days, engine, workers):
+    """nightly_run through the global ReadScheduler: one fleet-wide window of partition reads"""
+    start_date = BENCHMARK_END_DATE - timedelta(days=days - 1)
+    plans = [
+        {'thingid': thingid, 'status': 'planned', 'detail': '', 'elapsed': 0.0,
+         'units': [(start_date, BENCHMARK_END_DATE, False)]}
+        for thingid in assets
+    ]
+    ReadScheduler(FakeConnections(session, database), workers=workers, engine=engine).run(plans)
+
+
+def partition_reads(session, database, assets, days, engine, workers):
+    """fetch_logs_for_day over every partition, without calculating or writing"""
+    for thingid in assets:
+        for offset in range(days):
+            fetch_logs_for_day(session, thingid, BENCHMARK_END_DATE - timedelta(days=offset))
+
+
+SCENARIOS = {
+    'nightly': {'run': nightly_run, 'assets': 1000, 'days': 1,
+                'description': 'Nightly run: yesterday for every asset'},
+    'nightly_global': {'run': scheduled_run, 'assets': 1000, 'days': 1,
+                       'description': 'Nightly run with --scheduler global'},
+    # Partitions several times larger than the page size, so every read is paged
+    'nightly_paged': {'run': nightly_run, 'assets': 1000, 'days': 1, 'fetch_size': 50,
+                      'description': 'Nightly run with 50-row pages'},
+    'nightly_global_paged': {'run': scheduled_run, 'assets': 1000, 'days': 1, 'fetch_size': 50,
+                             'description': 'Nightly run with --scheduler global and 50-row pages'},
+    'backfill': {'run': nightly_run, 'assets': 1, 'days': 365,
+                 'description': 'Backfill of every asset in one range'},
+    'partition_read': {'run': partition_reads, 'assets': 1, 'days': 365,
+                       'description': 'fetch_logs_for_day over every partition, no calculation or writes'},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(name, profile, engine=None, workers=1, assets=None, days=None,
+                 cassandra_latency=0.0, postgres_latency=0.0, trace_memory=False):
+    """
+    Run one scenario against fresh stand-ins and measure it
+    Returns:
+        dict: Scenario parameters, throughput, query counts and peak memory
+    """
+    scenario = SCENARIOS[name]
+    assets = assets or scenario['assets']
+    days = days or scenario['days']
+    stats = BenchmarkStats()
+    session = FakeCassandraSession(profile, stats, cassandra_latency)
+    database = FakePostgresDatabase(stats, postgres_latency)
+
+    fetch_size = scenario.get('fetch_size', settings.CASSANDRA_FETCH_SIZE)
+    default_fetch_size = settings.CASSANDRA_FETCH_SIZE
+    settings.CASSANDRA_FETCH_SIZE = fetch_size
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        scenario['run'](session, database, asset_ids(assets), days, engine, workers)
+        elapsed = time.perf_counter() - started
+    finally:
+        settings.CASSANDRA_FETCH_SIZE = default_fetch_size
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        # ru_maxrss is in kilobytes on Linux; it is the peak of the whole process so far
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    counters = stats.snapshot()
+    return {
+        'scenario': name,
+        'description': scenario['description'],
+        'assets': assets,
+        'days': days,
+        'engine': engine,
+        'workers': workers,
+        'fetch_size': fetch_size,
+        'cassandra_latency': cassandra_latency,
+        'postgres_latency': postgres_latency,
+        'elapsed_s': round(elapsed, 4),
+        'events': counters['rows_read'],
+        'events_per_s': round(counters['rows_read'] / elapsed, 1) if elapsed else None,
+        'rows_written': counters['rows_written'],
+        'rows_per_s': round(counters['rows_written'] / elapsed, 1) if elapsed else None,
+        'queries': counters['cassandra_requests'] + counters['postgres_statements'],
+        'cassandra_requests': counters['cassandra_requests'],
+        'postgres_statements': counters['postgres_statements'],
+        'postgres_commits': counters['postgres_commits'],
+        'peak_memory_bytes': peak_memory,
+        'peak_memory_source': 'tracemalloc' if trace_memory else 'ru_maxrss',
+    }
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Benchmark run hour calculation against in-process stand-ins')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS) + ['all'], default='all')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default=None,
+                        help='Run hour engine (default: RUN_HOUR_ENGINE setting)')
+    parser.add_argument('--workers', type=int, default=1, help='Assets processed concurrently')
+    parser.add_argument('--assets', type=int, default=None, help="Override the scenario's asset count")
+    parser.add_argument('--days', type=int, default=None, help="Override the scenario's day count")
+    parser.add_argument('--events-per-day', type=int, default=200)
+    parser.add_argument('--crossing-ratio', type=float, default=0.3,
+                        help='Share of days ending ON, i.e. intervals crossing midnight')
+    parser.add_argument('--noise-ratio', type=float, default=0.05,
+                        help='Share of rows that are not a clean ON/OFF alternation')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cassandra-latency', type=float, default=0.0, help='Seconds per Cassandra round trip')
+    parser.add_argument('--postgres-latency', type=float, default=0.0, help='Seconds per PostgreSQL round trip')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Measure peak Python allocations with tracemalloc (slower)')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', default=None,
+                        help='JSON report path (default: .cache/benchmarks/<git revision>.json)')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    profile = EventProfile(args.events_per_day, args.crossing_ratio, args.noise_ratio, args.seed)
+    names = sorted(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    results = [
+        run_scenario(
+            name, profile, args.engine, max(1, args.workers), args.assets, args.days,
+            args.cassandra_latency, args.postgres_latency, args.trace_memory
+        )
+        for name in names
+    ]
+
+    revision = git_revision()
+    report = json.dumps({
+        'revision': revision,
+        'python': platform.python_version(),
+        'profile': profile.as_dict(),
+        'results': results
+    }, indent=2)
+    output = args.output or os.path.join(".cache", "benchmarks", f"{revision or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        output_file.write(report + "\n")
+    sys.stderr.write(f"Wrote benchmark report to {output}\n")
+
+
+if __name__ == "__main__":
+    main()
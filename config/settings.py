@@ -16,5 +16,55 @@ class Config:
     API_USERNAME = os.getenv("API_USERNAME")
     API_PASSWORD = os.getenv("API_PASSWORD")
     TIMEZONE = os.getenv("TIMEZONE")
+    # Connection pool sizing (see app.connections)
+    POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+    POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+    CASSANDRA_EXECUTOR_THREADS = int(os.getenv("CASSANDRA_EXECUTOR_THREADS", "2"))
+    # Only honoured by protocol versions 1 and 2
+    CASSANDRA_CONNECTIONS_PER_HOST = int(os.getenv("CASSANDRA_CONNECTIONS_PER_HOST", "2"))
+    # Maximum number of day-partition reads kept in flight per asset
+    CASSANDRA_CONCURRENCY = int(os.getenv("CASSANDRA_CONCURRENCY", "32"))
+    # Rows per page when streaming a day partition
+    CASSANDRA_FETCH_SIZE = int(os.getenv("CASSANDRA_FETCH_SIZE", "5000"))
+    # Earliest-log discovery: "linear" (day by day) or "bisect" (concurrent probe waves; only
+    # exact for assets that log every day once started, a gap in the history can hide earlier days)
+    EARLIEST_LOG_SEARCH = os.getenv("EARLIEST_LOG_SEARCH", "linear")
+    EARLIEST_LOG_PROBES = int(os.getenv("EARLIEST_LOG_PROBES", "16"))
+    # Run hour engine: "python" (per-event loop) or "numpy" (vectorized)
+    RUN_HOUR_ENGINE = os.getenv("RUN_HOUR_ENGINE", "python")
+    # Batches of at least this many run_hours rows are written with COPY + one merge
+    RUN_HOURS_COPY_THRESHOLD = int(os.getenv("RUN_HOURS_COPY_THRESHOLD", "1000"))
+    # Local asset snapshot: used without calling the API while younger than the TTL (seconds)
+    ASSET_CACHE_PATH = os.getenv("ASSET_CACHE_PATH", ".cache/assets.jsonl")
+    ASSET_CACHE_TTL = int(os.getenv("ASSET_CACHE_TTL", "3600"))
+    # Checkpoint journal read by --resume
+    RUN_JOURNAL_PATH = os.getenv("RUN_JOURNAL_PATH", ".cache/run_journal.jsonl")
+
+    # Read scheduling: "asset" (per-asset reads on each worker) or "global" (one fleet-wide window
+    # of partition reads in flight, READ_SCHEDULER_WINDOW reads at once)
+    READ_SCHEDULER = os.getenv("READ_SCHEDULER", "asset")
+    READ_SCHEDULER_WINDOW = int(os.getenv("READ_SCHEDULER_WINDOW", "256"))
+
+    # --live: seconds between polls of today's partitions, and days of run_hours_live rows kept
+    LIVE_POLL_INTERVAL = int(os.getenv("LIVE_POLL_INTERVAL", "60"))
+    LIVE_RETENTION_DAYS = int(os.getenv("LIVE_RETENTION_DAYS", "2"))
+
+    # Prometheus textfile written at the end of each run (empty disables it)
+    METRICS_TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE_PATH", ".cache/run_hours.prom")
+
+    # Logging: "plain" (direct stderr writes) or "queue" (QueueHandler + background listener)
+    LOG_MODE = os.getenv("LOG_MODE", "plain")
+    LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+    # NOTIFY channel announcing run_hours writes to the read API (empty disables the notifications)
+    RUN_HOURS_NOTIFY_CHANNEL = os.getenv("RUN_HOURS_NOTIFY_CHANNEL", "run_hours_changed")
+    # Read API: optional bearer token, port, cache size and entry TTL (seconds), request limits
+    READ_API_TOKEN = os.getenv("READ_API_TOKEN")
+    READ_API_PORT = int(os.getenv("READ_API_PORT", "8081"))
+    READ_API_CACHE_SIZE = int(os.getenv("READ_API_CACHE_SIZE", "10000"))
+    READ_API_CACHE_TTL = int(os.getenv("READ_API_CACHE_TTL", "300"))
+    READ_API_MAX_DAYS = int(os.getenv("READ_API_MAX_DAYS", "366"))
+    READ_API_MAX_BULK_ASSETS = int(os.getenv("READ_API_MAX_BULK_ASSETS", "500"))
 
 settings = Config()